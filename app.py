@@ -1,10 +1,38 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import base64
+import bisect
+import functools
+import hashlib
+import hmac
+import html
+import json
+import os
+import queue
+import random
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.message import EmailMessage
 from PIL import Image
 from io import BytesIO
-from datetime import datetime, timedelta
+from streamlit.delta_generator import DeltaGenerator
+from catalogo import (DIRECTORIO_CATALOGO, DIRECTORIO_DATOS, TIPOS_COCINA, TIPOS_COLUMNAS, asegurar_tabla, cargar_tabla,
+                      anexar_altas, compactar, contar_altas, geocodificar, informe_memoria, tipar)
+from disponibilidad import HORA_POR_DEFECTO, MotorDisponibilidad, cancelar_reserva
+from indices import IndicePlatos, IndiceRestaurantes, MotorRecomendaciones, TablasCatalogo, peso_valoracion
+from datetime import date, datetime, timedelta
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
 # Configuración de la página
 st.set_page_config(
@@ -14,10 +42,150 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# -----------------------------
+# Instrumentación de reruns
+# -----------------------------
+RUTA_METRICAS = os.path.join(DIRECTORIO_DATOS, "metricas")
+
+class Perfilador:
+    # Tiempos por sección y por función auxiliar, y elementos/bytes emitidos por rerun.
+    # Se activa con LA_CUCHARA_PERFILADO=1 y solo mide la fracción de reruns indicada en
+    # LA_CUCHARA_MUESTREO; en los reruns no muestreados cada medida es un if y poco más.
+    def __init__(self, ruta, activo=False, muestreo=1.0, intervalo_volcado=10.0):
+        self.lock = threading.Lock()
+        self.ruta = ruta
+        self.activo = activo
+        self.muestreo = muestreo
+        self.intervalo_volcado = intervalo_volcado
+        self.ultimo_volcado = 0.0
+        self.secciones = {}
+        self.reruns = {'total': 0, 'elementos': 0, 'bytes': 0, 'max_elementos': 0, 'max_bytes': 0}
+        self.medidores = {}
+        self.local = threading.local()
+        self._interceptar_elementos()
+
+    def _interceptar_elementos(self):
+        # Todos los elementos de Streamlit pasan por DeltaGenerator._enqueue
+        original = getattr(DeltaGenerator, '_enqueue', None)
+        if original is None:
+            return
+        perfilador = self
+
+        @functools.wraps(original)
+        def _enqueue(dg, delta_type, element_proto, *args, **kwargs):
+            if getattr(perfilador.local, 'midiendo', False):
+                perfilador.local.elementos += 1
+                perfilador.local.bytes += element_proto.ByteSize()
+            return original(dg, delta_type, element_proto, *args, **kwargs)
+        DeltaGenerator._enqueue = _enqueue
+
+    def iniciar_rerun(self):
+        self.local.midiendo = self.activo and random.random() < self.muestreo
+        self.local.elementos = 0
+        self.local.bytes = 0
+        self.local.inicio = time.perf_counter()
+
+    def medidor(self, nombre, funcion):
+        # Valores instantáneos de otros componentes (p. ej. la cola de notificaciones)
+        self.medidores[nombre] = funcion
+
+    def registrar(self, nombre, segundos):
+        with self.lock:
+            estadistica = self.secciones.setdefault(nombre, {'llamadas': 0, 'segundos': 0.0, 'max_segundos': 0.0})
+            estadistica['llamadas'] += 1
+            estadistica['segundos'] += segundos
+            estadistica['max_segundos'] = max(estadistica['max_segundos'], segundos)
+
+    @contextmanager
+    def medir(self, nombre):
+        if not getattr(self.local, 'midiendo', False):
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nombre, time.perf_counter() - inicio)
+
+    def instrumentar(self, funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not getattr(self.local, 'midiendo', False):
+                return funcion(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                self.registrar(funcion.__name__, time.perf_counter() - inicio)
+        return envoltura
+
+    def finalizar_rerun(self):
+        if not getattr(self.local, 'midiendo', False):
+            return
+        self.local.midiendo = False
+        self.registrar('rerun', time.perf_counter() - self.local.inicio)
+        with self.lock:
+            self.reruns['total'] += 1
+            self.reruns['elementos'] += self.local.elementos
+            self.reruns['bytes'] += self.local.bytes
+            self.reruns['max_elementos'] = max(self.reruns['max_elementos'], self.local.elementos)
+            self.reruns['max_bytes'] = max(self.reruns['max_bytes'], self.local.bytes)
+            volcar = time.monotonic() - self.ultimo_volcado >= self.intervalo_volcado
+            if volcar:
+                self.ultimo_volcado = time.monotonic()
+        if volcar:
+            self.volcar()
+
+    def instantanea(self):
+        with self.lock:
+            datos = {'reruns': dict(self.reruns), 'secciones': {k: dict(v) for k, v in self.secciones.items()}}
+        datos['medidores'] = {nombre: funcion() for nombre, funcion in self.medidores.items()}
+        return datos
+
+    def texto_prometheus(self, datos):
+        lineas = [
+            "# TYPE la_cuchara_seccion_segundos summary",
+        ]
+        for nombre, estadistica in sorted(datos['secciones'].items()):
+            lineas.append(f'la_cuchara_seccion_segundos_sum{{seccion="{nombre}"}} {estadistica["segundos"]:.6f}')
+            lineas.append(f'la_cuchara_seccion_segundos_count{{seccion="{nombre}"}} {estadistica["llamadas"]}')
+        lineas.append("# TYPE la_cuchara_reruns_total counter")
+        lineas.append(f"la_cuchara_reruns_total {datos['reruns']['total']}")
+        lineas.append("# TYPE la_cuchara_elementos_total counter")
+        lineas.append(f"la_cuchara_elementos_total {datos['reruns']['elementos']}")
+        lineas.append("# TYPE la_cuchara_payload_bytes_total counter")
+        lineas.append(f"la_cuchara_payload_bytes_total {datos['reruns']['bytes']}")
+        for nombre, valores in sorted(datos['medidores'].items()):
+            for clave, valor in sorted(valores.items()):
+                lineas.append(f"# TYPE la_cuchara_{nombre}_{clave} gauge")
+                lineas.append(f"la_cuchara_{nombre}_{clave} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def volcar(self):
+        # Escritura atómica de metricas.json y metricas.prom
+        datos = self.instantanea()
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        for extension, contenido in [("json", json.dumps(datos, indent=2)), ("prom", self.texto_prometheus(datos))]:
+            temporal = f"{self.ruta}.{extension}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(contenido)
+            os.replace(temporal, f"{self.ruta}.{extension}")
+
+@st.cache_resource
+def obtener_perfilador():
+    return Perfilador(RUTA_METRICAS,
+                      activo=os.environ.get("LA_CUCHARA_PERFILADO", "0") == "1",
+                      muestreo=float(os.environ.get("LA_CUCHARA_MUESTREO", "1.0")))
+
+perfilador = obtener_perfilador()
+perfilador.iniciar_rerun()
+
 # -----------------------------
 # Funciones de carga de datos (simulados)
 # -----------------------------
-@st.cache_data
+# cache_resource y no cache_data: cache_data serializa y devuelve una copia en cada
+# rerun; así todas las sesiones comparten las mismas tablas cargadas del almacén
+@st.cache_resource
 def cargar_restaurantes():
     restaurantes = pd.DataFrame({
         'id': range(1, 6),
@@ -52,9 +220,11 @@ def cargar_restaurantes():
         'menu_vegano': [False, False, False, False, True]
     })
     restaurantes["descripcion"] = ""
-    return restaurantes
+    # Los datos de ejemplo solo siembran el almacén columnar la primera vez
+    asegurar_tabla('restaurantes', restaurantes)
+    return cargar_tabla('restaurantes')
 
-@st.cache_data
+@st.cache_resource
 def cargar_platos():
     platos = pd.DataFrame({
         'id': range(1, 16),
@@ -77,9 +247,10 @@ def cargar_platos():
         'vegetariano': [True, False, True, False, True, True, False, True, True, False, False, True, True, True, True],
         'vegano': [True, False, False, False, False, True, False, False, False, False, False, True, True, True, False]
     })
-    return platos
+    asegurar_tabla('platos', platos)
+    return cargar_tabla('platos')
 
-@st.cache_data
+@st.cache_resource
 def cargar_reservas_iniciales():
     reservas = pd.DataFrame({
         'id': range(1, 3),
@@ -87,28 +258,809 @@ def cargar_reservas_iniciales():
         'fecha': [datetime.now() + timedelta(days=1), datetime.now() + timedelta(days=3)],
         'hora': ['14:00', '21:00'],
         'num_personas': [2, 4],
-        'platos': [
-            'Gazpacho andaluz, Paella valenciana, Tarta de queso',
-            'Pasta carbonara, Pizza margarita, Tiramisú'
-        ],
+        'platos': [[1, 2, 3], [7, 8, 9]],  # ids de platos
         'estado': ['Confirmada', 'Pendiente']
     })
-    return reservas
+    return tipar(reservas, 'reservas')
 
 # -----------------------------
-# Inicialización del estado de sesión
+# Índice de texto de platos
+# -----------------------------
+@st.cache_resource
+def obtener_indice_platos():
+    return IndicePlatos()
+
+# -----------------------------
+# Caché de imágenes de restaurantes
+# -----------------------------
+TAMANO_IMAGEN = (400, 200)
+DIRECTORIO_FOTOS = os.path.join(DIRECTORIO_DATOS, "fotos")
+
+class CacheImagenes:
+    # LRU con presupuesto en bytes de imágenes ya codificadas, por (restaurante_id, versión).
+    # Las fotos subidas se reducen a miniatura una sola vez al subirlas y se guardan en
+    # disco como <id>-<versión>.jpg; en memoria solo están las que entran en el presupuesto.
+    def __init__(self, directorio, max_bytes=16 * 1024 * 1024):
+        self.lock = threading.Lock()
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entradas = OrderedDict()
+        self.versiones = {}
+        for nombre in os.listdir(directorio):
+            base, extension = os.path.splitext(nombre)
+            restaurante_id, _, version = base.partition("-")
+            if extension == ".jpg" and restaurante_id.isdigit() and version.isdigit():
+                restaurante_id = int(restaurante_id)
+                self.versiones[restaurante_id] = max(self.versiones.get(restaurante_id, 0), int(version))
+
+    def _ruta(self, restaurante_id, version):
+        return os.path.join(self.directorio, f"{restaurante_id}-{version}.jpg")
+
+    def obtener(self, restaurante_id):
+        with self.lock:
+            clave = (restaurante_id, self.versiones.get(restaurante_id, 0))
+            if clave in self.entradas:
+                self.entradas.move_to_end(clave)
+                return self.entradas[clave]
+        datos = None
+        if clave[1]:
+            try:
+                with open(self._ruta(*clave), "rb") as f:
+                    datos = f.read()
+            except FileNotFoundError:
+                pass
+        if datos is None:
+            datos = self._generar_marcador(restaurante_id)
+        self._cachear(clave, datos)
+        return datos
+
+    def _cachear(self, clave, datos):
+        with self.lock:
+            if clave not in self.entradas:
+                self.entradas[clave] = datos
+                self.bytes += len(datos)
+                while self.bytes > self.max_bytes and len(self.entradas) > 1:
+                    _, antiguo = self.entradas.popitem(last=False)
+                    self.bytes -= len(antiguo)
+
+    def guardar_foto(self, restaurante_id, contenido):
+        img = Image.open(BytesIO(contenido)).convert('RGB')
+        img.thumbnail(TAMANO_IMAGEN)
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=85)
+        datos = buffered.getvalue()
+        with self.lock:
+            anterior = self.versiones.get(restaurante_id, 0)
+            clave = (restaurante_id, anterior + 1)
+            # Escritura atómica; la versión anterior deja de servirse y se borra
+            with tempfile.NamedTemporaryFile(dir=self.directorio, suffix=".tmp", delete=False) as tmp:
+                tmp.write(datos)
+            os.replace(tmp.name, self._ruta(*clave))
+            self.versiones[restaurante_id] = clave[1]
+            if anterior:
+                self.bytes -= len(self.entradas.pop((restaurante_id, anterior), b""))
+                if os.path.exists(self._ruta(restaurante_id, anterior)):
+                    os.remove(self._ruta(restaurante_id, anterior))
+        self._cachear(clave, datos)
+
+    def _generar_marcador(self, restaurante_id):
+        # Mismo color que con np.random.seed(id), pero sin tocar el estado global de NumPy
+        rng = np.random.RandomState(int(restaurante_id))
+        color = tuple(int(rng.randint(100, 200)) for _ in range(3))
+        img = Image.new('RGB', TAMANO_IMAGEN, color=color)
+        buffered = BytesIO()
+        img.save(buffered, format="PNG")
+        return buffered.getvalue()
+
+@st.cache_resource
+def obtener_cache_imagenes():
+    return CacheImagenes(DIRECTORIO_FOTOS)
+
+# -----------------------------
+# Almacén de menús en PDF
+# -----------------------------
+# Streamlit solo sirve por URL lo que hay en static/ (enableStaticServing). LA_CUCHARA_MENUS
+# guarda los PDF en otro sitio cuando no se sirven, p. ej. en benchmark.py junto a su base
+# de datos temporal, para no dejar en static/menus menús que ninguna base de datos conoce.
+DIRECTORIO_MENUS = os.environ.get("LA_CUCHARA_MENUS") or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "menus")
+URL_MENUS = "app/static/menus"
+
+class AlmacenPdf:
+    # Almacén direccionado por contenido: cada PDF se guarda una sola vez en disco con
+    # el nombre de su hash SHA-256 y se sirve por URL desde el servidor de estáticos de
+    # Streamlit (con soporte de peticiones Range). Qué menú tiene cada restaurante se
+    # guarda en SQLite (tabla menus) y se lee de memoria.
+    def __init__(self, directorio, bd):
+        self.directorio = directorio
+        self.bd = bd
+        os.makedirs(directorio, exist_ok=True)
+        with self.bd.conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS menus (
+                    restaurante_id INTEGER PRIMARY KEY,
+                    clave TEXT NOT NULL
+                )""")
+            self.menus = dict(conexion.execute("SELECT restaurante_id, clave FROM menus").fetchall())
+
+    def asignar(self, restaurante_id, clave):
+        with self.bd.transaccion() as conexion:
+            conexion.execute("INSERT OR REPLACE INTO menus (restaurante_id, clave) VALUES (?, ?)",
+                             (int(restaurante_id), clave))
+        self.menus[int(restaurante_id)] = clave
+
+    def menu(self, restaurante_id):
+        return self.menus.get(int(restaurante_id))
+
+    def ruta(self, clave, extension="pdf"):
+        return os.path.join(self.directorio, f"{clave}.{extension}")
+
+    def url(self, clave):
+        return f"{URL_MENUS}/{clave}.pdf"
+
+    def miniatura(self, clave):
+        ruta = self.ruta(clave, "png")
+        return ruta if os.path.exists(ruta) else None
+
+    def guardar(self, archivo):
+        # Se copia por bloques calculando el hash; si ya existía, se descarta la copia.
+        sha = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.directorio, suffix=".tmp", delete=False) as tmp:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b""):
+                sha.update(bloque)
+                tmp.write(bloque)
+        clave = sha.hexdigest()
+        if os.path.exists(self.ruta(clave)):
+            os.remove(tmp.name)
+        else:
+            os.replace(tmp.name, self.ruta(clave))
+        return clave
+
+    def generar_miniatura(self, clave):
+        # Primera página renderizada una única vez al subir el menú (requiere pypdfium2,
+        # declarado en requirements.txt). Los fallos se propagan para avisar al usuario.
+        if self.miniatura(clave) is not None:
+            return
+        if pdfium is None:
+            raise RuntimeError("pypdfium2 no está instalado (pip install -r requirements.txt)")
+        pdf = pdfium.PdfDocument(self.ruta(clave))
+        try:
+            imagen = pdf[0].render(scale=0.5).to_pil()
+        finally:
+            pdf.close()
+        imagen.thumbnail((300, 400))
+        with tempfile.NamedTemporaryFile(dir=self.directorio, suffix=".tmp", delete=False) as tmp:
+            imagen.save(tmp, format="PNG")
+        os.replace(tmp.name, self.ruta(clave, "png"))
+
+@st.cache_resource
+def obtener_almacen_pdf():
+    return AlmacenPdf(DIRECTORIO_MENUS, obtener_base_datos())
+
+# -----------------------------
+# Base de datos y repositorio de reservas (SQLite)
+# -----------------------------
+RUTA_BASE_DATOS = os.path.join(DIRECTORIO_DATOS, "la_cuchara.db")
+
+class BaseDatos:
+    # Pool de conexiones SQLite en modo WAL compartido por todos los repositorios
+    def __init__(self, ruta, tamano_pool=8):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self.pool = queue.Queue()
+        for _ in range(tamano_pool):
+            conexion = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self.pool.put(conexion)
+
+    @contextmanager
+    def conexion(self):
+        conexion = self.pool.get()
+        try:
+            yield conexion
+        finally:
+            self.pool.put(conexion)
+
+    @contextmanager
+    def transaccion(self):
+        with self.conexion() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                yield conexion
+            except Exception:
+                conexion.execute("ROLLBACK")
+                raise
+            conexion.execute("COMMIT")
+
+    def anadir_columna(self, conexion, tabla, columna, definicion):
+        # Migración de bases creadas antes de existir la columna
+        if columna not in {fila[1] for fila in conexion.execute(f"PRAGMA table_info({tabla})")}:
+            conexion.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+@st.cache_resource
+def obtener_base_datos():
+    return BaseDatos(RUTA_BASE_DATOS)
+
 # -----------------------------
-if 'reservas_df' not in st.session_state:
-    st.session_state.reservas_df = cargar_reservas_iniciales()
+# Notificaciones de reservas (bandeja de salida)
+# -----------------------------
+DIRECTORIO_NOTIFICACIONES = os.path.join(DIRECTORIO_DATOS, "notificaciones")
+MAX_INTENTOS_NOTIFICACION = 6
+ESPERA_BASE_NOTIFICACION = 2.0  # segundos; se duplica en cada reintento
+ASUNTOS_NOTIFICACION = {
+    'confirmada': "Reserva confirmada",
+    'modificada': "Reserva modificada",
+    'cancelada': "Reserva cancelada",
+}
+
+class CanalArchivo:
+    # Sustituto local de email/SMS/push: una línea JSON por notificación. Recuerda las
+    # claves ya escritas para que una reentrega tras un fallo no duplique mensajes.
+    def __init__(self, nombre, directorio):
+        self.nombre = nombre
+        self.lock = threading.Lock()
+        self.ruta = os.path.join(directorio, f"{nombre}.jsonl")
+        os.makedirs(directorio, exist_ok=True)
+        self.entregadas = set()
+        if os.path.exists(self.ruta):
+            with open(self.ruta, encoding="utf-8") as f:
+                self.entregadas = {json.loads(linea)['clave'] for linea in f if linea.strip()}
+
+    def enviar(self, notificaciones):
+        with self.lock, open(self.ruta, "a", encoding="utf-8") as f:
+            for notificacion in notificaciones:
+                if notificacion['clave'] not in self.entregadas:
+                    f.write(json.dumps(notificacion, ensure_ascii=False) + "\n")
+                    self.entregadas.add(notificacion['clave'])
+
+class CanalSmtp:
+    # Email por SMTP, una conexión por lote. Para pruebas sirve un servidor de depuración
+    # (python -m smtpd -n -c DebuggingServer localhost:1025, o aiosmtpd desde Python 3.12).
+    # El Message-ID es la clave de idempotencia, así el receptor puede descartar reentregas.
+    def __init__(self, nombre, servidor, remitente="reservas@lacuchara.es", destinatario="comensal@lacuchara.es"):
+        self.nombre = nombre
+        self.host, _, puerto = servidor.partition(":")
+        self.puerto = int(puerto or 25)
+        self.remitente = remitente
+        self.destinatario = destinatario
+
+    def enviar(self, notificaciones):
+        with smtplib.SMTP(self.host, self.puerto, timeout=10) as smtp:
+            for notificacion in notificaciones:
+                mensaje = EmailMessage()
+                mensaje['From'] = self.remitente
+                mensaje['To'] = self.destinatario
+                mensaje['Subject'] = ASUNTOS_NOTIFICACION[notificacion['tipo']]
+                mensaje['Message-ID'] = f"<{notificacion['clave']}@lacuchara.es>"
+                mensaje.set_content(json.dumps(notificacion['reserva'], ensure_ascii=False, indent=2))
+                smtp.send_message(mensaje)
+
+class BandejaNotificaciones:
+    # Patrón outbox: el evento se guarda en la misma transacción que el cambio de la
+    # reserva (una fila por canal) y un hilo de fondo lo entrega después, así el rerun
+    # solo paga el INSERT. El despachador reparte lotes por canal a un pool de hilos;
+    # los fallos se reintentan con espera exponencial y las claves son idempotentes.
+    def __init__(self, bd, canales, trabajadores=4, tamano_lote=50, intervalo=1.0):
+        self.bd = bd
+        self.canales = {canal.nombre: canal for canal in canales}
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.latencias = deque(maxlen=1000)
+        self.ultimo_error = ""
+        with self.bd.conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS notificaciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    clave TEXT NOT NULL UNIQUE,
+                    canal TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    reserva_id INTEGER NOT NULL,
+                    carga TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    creado REAL NOT NULL,
+                    proximo_intento REAL NOT NULL,
+                    enviado REAL,
+                    error TEXT NOT NULL DEFAULT ''
+                )""")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_notificaciones_pendientes "
+                             "ON notificaciones (estado, proximo_intento)")
+        self.pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="notificaciones")
+        self.despertador = threading.Event()
+        threading.Thread(target=self._bucle, name="bandeja-notificaciones", daemon=True).start()
+
+    def registrar(self, conexion, tipo, reserva):
+        # Se llama dentro de la transacción de la reserva. La clave es la identidad del
+        # evento (reserva y revisión, que sube con cada cambio en esa misma transacción):
+        # volver de 20:00 a una hora anterior es otro evento aunque la carga se repita, y
+        # solo se descarta la reentrega del mismo evento.
+        carga = json.dumps(reserva, sort_keys=True, ensure_ascii=False)
+        ahora = time.time()
+        conexion.executemany(
+            "INSERT OR IGNORE INTO notificaciones (clave, canal, tipo, reserva_id, carga, creado, proximo_intento) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"{tipo}-{reserva['id']}-r{reserva['revision']}-{canal}", canal, tipo, reserva['id'], carga, ahora, ahora)
+             for canal in self.canales])
+
+    def despertar(self):
+        self.despertador.set()
+
+    def _bucle(self):
+        while True:
+            self.despertador.wait(self.intervalo)
+            self.despertador.clear()
+            try:
+                while self.procesar() == self.tamano_lote * len(self.canales):
+                    pass
+            except Exception as error:
+                self.ultimo_error = repr(error)
+
+    def procesar(self):
+        # Entrega las notificaciones vencidas y espera a que terminen todos los lotes
+        # antes de volver a leer la cola, para no enviar dos veces la misma fila
+        marcadores = ", ".join("?" * len(self.canales))
+        with self.bd.conexion() as conexion:
+            filas = conexion.execute(
+                f"SELECT id, clave, canal, tipo, reserva_id, carga, intentos, creado FROM notificaciones "
+                f"WHERE estado = 'pendiente' AND proximo_intento <= ? AND canal IN ({marcadores}) "
+                f"ORDER BY id LIMIT ?",
+                (time.time(), *self.canales, self.tamano_lote * len(self.canales))).fetchall()
+        lotes = {}
+        for fila in filas:
+            lotes.setdefault(fila[2], []).append(fila)
+        futuros = [self.pool.submit(self._entregar, canal, lote[i:i + self.tamano_lote])
+                   for canal, lote in lotes.items() for i in range(0, len(lote), self.tamano_lote)]
+        for futuro in futuros:
+            futuro.result()
+        return len(filas)
+
+    def _entregar(self, canal, lote):
+        notificaciones = [{'clave': clave, 'tipo': tipo, 'reserva': json.loads(carga)}
+                          for _, clave, _, tipo, _, carga, _, _ in lote]
+        try:
+            self.canales[canal].enviar(notificaciones)
+        except Exception as error:
+            self._reintentar(lote, error)
+            return
+        ahora = time.time()
+        with self.bd.transaccion() as conexion:
+            conexion.executemany("UPDATE notificaciones SET estado = 'enviada', enviado = ?, intentos = intentos + 1 "
+                                 "WHERE id = ?", [(ahora, fila[0]) for fila in lote])
+        with self.lock:
+            self.latencias.extend(ahora - fila[7] for fila in lote)
+
+    def _reintentar(self, lote, error):
+        ahora = time.time()
+        self.ultimo_error = repr(error)
+        cambios = []
+        for fila in lote:
+            intentos = fila[6] + 1
+            estado = 'fallida' if intentos >= MAX_INTENTOS_NOTIFICACION else 'pendiente'
+            espera = ESPERA_BASE_NOTIFICACION * 2 ** (intentos - 1) * random.uniform(0.5, 1.0)
+            cambios.append((estado, intentos, ahora + espera, repr(error), fila[0]))
+        with self.bd.transaccion() as conexion:
+            conexion.executemany("UPDATE notificaciones SET estado = ?, intentos = ?, proximo_intento = ?, error = ? "
+                                 "WHERE id = ?", cambios)
+
+    def metricas(self):
+        with self.bd.conexion() as conexion:
+            estados = dict(conexion.execute("SELECT estado, COUNT(*) FROM notificaciones GROUP BY estado").fetchall())
+            mas_antigua = conexion.execute("SELECT MIN(creado) FROM notificaciones WHERE estado = 'pendiente'").fetchone()[0]
+        with self.lock:
+            latencias = np.array(self.latencias)
+        return {
+            'pendientes': estados.get('pendiente', 0),
+            'enviadas': estados.get('enviada', 0),
+            'fallidas': estados.get('fallida', 0),
+            'antiguedad_max_segundos': round(time.time() - mas_antigua, 3) if mas_antigua else 0.0,
+            'latencia_p50_segundos': round(float(np.percentile(latencias, 50)), 3) if len(latencias) else 0.0,
+            'latencia_p95_segundos': round(float(np.percentile(latencias, 95)), 3) if len(latencias) else 0.0,
+        }
+
+@st.cache_resource
+def obtener_bandeja_notificaciones():
+    # Confirmación al comensal y aviso al restaurante. Con LA_CUCHARA_SMTP=host:puerto
+    # la del comensal se envía por email; si no, ambas se escriben en data/notificaciones.
+    servidor_smtp = os.environ.get("LA_CUCHARA_SMTP")
+    canales = [
+        CanalSmtp('comensal', servidor_smtp) if servidor_smtp else CanalArchivo('comensal', DIRECTORIO_NOTIFICACIONES),
+        CanalArchivo('restaurante', DIRECTORIO_NOTIFICACIONES),
+    ]
+    bandeja = BandejaNotificaciones(obtener_base_datos(), canales)
+    obtener_perfilador().medidor('notificaciones', bandeja.metricas)
+    return bandeja
+
+USUARIO_INVITADO = "invitado"  # dueño de las reservas de ejemplo y de las creadas antes de haber propietarios
+
+def usuario_valido(valor):
+    # Solo se aceptan identificadores con la forma de los que genera la app (UUID en hex):
+    # así ni USUARIO_INVITADO ni otro texto escrito en la URL dan acceso a reservas ajenas
+    try:
+        return uuid.UUID(hex=valor).hex if valor else None
+    except ValueError:
+        return None
+
+class RepositorioReservas:
+    # Reservas compartidas por todas las sesiones en SQLite (modo WAL). Los ids los
+    # asigna la propia base de datos, así que dos usuarios nunca obtienen el mismo.
+    # Cada reserva tiene propietario: solo él la ve, la modifica o la cancela. La
+    # revisión sube con cada cambio e identifica el evento en las notificaciones.
+    COLUMNAS = ['id', 'restaurante_id', 'fecha', 'hora', 'num_personas', 'platos', 'estado', 'comentario', 'propietario',
+                'revision']
+
+    def __init__(self, bd, bandeja=None):
+        self.bd = bd
+        self.bandeja = bandeja
+        with self.bd.conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS reservas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    restaurante_id INTEGER NOT NULL,
+                    fecha TEXT NOT NULL,
+                    hora TEXT NOT NULL,
+                    num_personas INTEGER NOT NULL,
+                    platos TEXT NOT NULL DEFAULT '[]',
+                    estado TEXT NOT NULL,
+                    comentario TEXT NOT NULL DEFAULT '',
+                    propietario TEXT NOT NULL DEFAULT 'invitado',
+                    revision INTEGER NOT NULL DEFAULT 0
+                )""")
+            self.bd.anadir_columna(conexion, 'reservas', 'propietario', f"TEXT NOT NULL DEFAULT '{USUARIO_INVITADO}'")
+            self.bd.anadir_columna(conexion, 'reservas', 'revision', "INTEGER NOT NULL DEFAULT 0")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_reservas_restaurante_fecha ON reservas (restaurante_id, fecha)")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_reservas_propietario ON reservas (propietario, id)")
+
+    def sembrar(self, reservas):
+        # Carga las reservas iniciales solo si la tabla está vacía
+        with self.bd.transaccion() as conexion:
+            if conexion.execute("SELECT 1 FROM reservas LIMIT 1").fetchone() is None:
+                for _, reserva in reservas.iterrows():
+                    self._insertar(conexion, reserva.to_dict())
+
+    def _fecha(self, fecha):
+        return pd.Timestamp(fecha).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _insertar(self, conexion, reserva):
+        cursor = conexion.execute(
+            "INSERT INTO reservas (restaurante_id, fecha, hora, num_personas, platos, estado, comentario, propietario) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (int(reserva['restaurante_id']), self._fecha(reserva['fecha']), reserva['hora'],
+             int(reserva['num_personas']), json.dumps([int(p) for p in reserva.get('platos', [])]),
+             reserva['estado'], reserva.get('comentario', ""), reserva.get('propietario', USUARIO_INVITADO))
+        )
+        return cursor.lastrowid
+
+    def migrar_platos(self, ids_por_nombre):
+        # Las reservas antiguas guardaban los nombres de los platos separados por comas;
+        # se traducen a la lista de ids de su restaurante
+        with self.bd.transaccion() as conexion:
+            antiguas = conexion.execute("SELECT id, restaurante_id, platos FROM reservas WHERE platos NOT LIKE '[%'").fetchall()
+            for reserva_id, restaurante_id, platos in antiguas:
+                ids = [ids_por_nombre[(restaurante_id, nombre)] for nombre in platos.split(", ")
+                       if (restaurante_id, nombre) in ids_por_nombre]
+                conexion.execute("UPDATE reservas SET platos = ? WHERE id = ?", (json.dumps(ids), reserva_id))
+
+    def _tabla(self, filas):
+        reservas = pd.DataFrame(filas, columns=self.COLUMNAS)
+        reservas['fecha'] = pd.to_datetime(reservas['fecha'], format="%Y-%m-%d %H:%M:%S")
+        # Se construye ya como lista Arrow: con astype, una tabla vacía no sabría convertirse
+        reservas['platos'] = pd.array([json.loads(platos) for platos in reservas['platos']],
+                                      dtype=TIPOS_COLUMNAS['reservas']['platos'])
+        return tipar(reservas, 'reservas')
 
-if 'nuevos_restaurantes' not in st.session_state:
-    st.session_state.nuevos_restaurantes = pd.DataFrame(columns=[
-        'id', 'nombre', 'valoracion', 'ubicacion', 'tipo', 'precio_min', 'precio_max', 
-        'promocionado', 'menu_diario', 'menu_celiaco', 'menu_vegetariano', 'menu_vegano', 'descripcion'
-    ])
+    def _notificar(self, conexion, tipo, reserva_id):
+        # Encola el evento en la misma transacción; la entrega es asíncrona
+        if self.bandeja is None:
+            return
+        fila = conexion.execute(f"SELECT {', '.join(self.COLUMNAS)} FROM reservas WHERE id = ?", (reserva_id,)).fetchone()
+        reserva = dict(zip(self.COLUMNAS, fila))
+        reserva['platos'] = json.loads(reserva['platos'])
+        self.bandeja.registrar(conexion, tipo, reserva)
 
-if 'menu_pdfs' not in st.session_state:
-    st.session_state.menu_pdfs = {}
+    @contextmanager
+    def _transaccion(self):
+        with self.bd.transaccion() as conexion:
+            yield conexion
+        if self.bandeja is not None:
+            self.bandeja.despertar()
+
+    def crear(self, reserva):
+        with self._transaccion() as conexion:
+            reserva_id = self._insertar(conexion, reserva)
+            self._notificar(conexion, 'confirmada', reserva_id)
+            return reserva_id
+
+    def modificar(self, reserva_id, propietario, fecha, hora, num_personas):
+        # Devuelve el número de filas cambiadas: 0 si la reserva no es de este propietario
+        # o ya está cancelada
+        with self._transaccion() as conexion:
+            cambiadas = conexion.execute(
+                "UPDATE reservas SET fecha = ?, hora = ?, num_personas = ?, revision = revision + 1 "
+                "WHERE id = ? AND propietario = ? AND estado != 'Cancelada'",
+                (self._fecha(fecha), hora, int(num_personas), int(reserva_id), propietario)).rowcount
+            if cambiadas:
+                self._notificar(conexion, 'modificada', int(reserva_id))
+            return cambiadas
+
+    def cancelar(self, reserva_id, propietario):
+        # Solo cuenta si la reserva seguía activa: cancelar dos veces devuelve 0 la segunda
+        with self._transaccion() as conexion:
+            cambiadas = conexion.execute(
+                "UPDATE reservas SET estado = 'Cancelada', revision = revision + 1 "
+                "WHERE id = ? AND propietario = ? AND estado != 'Cancelada'",
+                (int(reserva_id), propietario)).rowcount
+            if cambiadas:
+                self._notificar(conexion, 'cancelada', int(reserva_id))
+            return cambiadas
+
+    def obtener(self, reserva_id, propietario):
+        with self.bd.conexion() as conexion:
+            fila = conexion.execute(f"SELECT {', '.join(self.COLUMNAS)} FROM reservas WHERE id = ? AND propietario = ?",
+                                    (int(reserva_id), propietario)).fetchone()
+        if fila is None:
+            return None
+        return self._tabla([fila]).iloc[0]
+
+    def listar(self, propietario=None):
+        # Reservas activas de un propietario; sin él, las de todos (disponibilidad, historial)
+        consulta = f"SELECT {', '.join(self.COLUMNAS)} FROM reservas WHERE estado != 'Cancelada'"
+        parametros = ()
+        if propietario is not None:
+            consulta += " AND propietario = ?"
+            parametros = (propietario,)
+        with self.bd.conexion() as conexion:
+            filas = conexion.execute(consulta + " ORDER BY id", parametros).fetchall()
+        return self._tabla(filas)
+
+@st.cache_resource
+def obtener_repositorio_reservas():
+    repositorio = RepositorioReservas(obtener_base_datos(), obtener_bandeja_notificaciones())
+    repositorio.sembrar(cargar_reservas_iniciales())
+    platos = cargar_platos()
+    repositorio.migrar_platos(dict(zip(zip(platos['restaurante_id'].tolist(), platos['nombre']), platos['id'].tolist())))
+    return repositorio
+
+# -----------------------------
+# Valoraciones: registro y agregados
+# -----------------------------
+PESO_PREVIO_VALORACION = 5  # número de votos "virtuales" con la valoración de catálogo
+TAMANO_BLOQUE_RECALCULO = 10000
+
+class RepositorioValoraciones:
+    # Registro de valoraciones solo de inserción (tabla valoraciones) y agregados por
+    # restaurante y por plato (número, suma, histograma y puntuación bayesiana) que se
+    # actualizan en la misma transacción de cada escritura. Las lecturas son O(1) en memoria.
+    def __init__(self, bd, peso_previo=PESO_PREVIO_VALORACION):
+        self.bd = bd
+        self.peso_previo = peso_previo
+        self.lock = threading.Lock()
+        with self.bd.conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS valoraciones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tipo TEXT NOT NULL,
+                    objeto_id INTEGER NOT NULL,
+                    restaurante_id INTEGER NOT NULL,
+                    puntuacion INTEGER NOT NULL,
+                    comentario TEXT NOT NULL DEFAULT '',
+                    fecha TEXT NOT NULL,
+                    usuario TEXT NOT NULL DEFAULT 'invitado'
+                )""")
+            self.bd.anadir_columna(conexion, 'valoraciones', 'usuario', f"TEXT NOT NULL DEFAULT '{USUARIO_INVITADO}'")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS agregados_valoraciones (
+                    tipo TEXT NOT NULL,
+                    objeto_id INTEGER NOT NULL,
+                    num INTEGER NOT NULL,
+                    suma INTEGER NOT NULL,
+                    h1 INTEGER NOT NULL, h2 INTEGER NOT NULL, h3 INTEGER NOT NULL,
+                    h4 INTEGER NOT NULL, h5 INTEGER NOT NULL,
+                    previo REAL NOT NULL,
+                    puntuacion REAL NOT NULL,
+                    PRIMARY KEY (tipo, objeto_id)
+                )""")
+            filas = conexion.execute("SELECT * FROM agregados_valoraciones").fetchall()
+        self.agregados = {(f[0], f[1]): self._agregado(f[2], f[3], f[4:9], f[9], f[10]) for f in filas}
+
+    def _agregado(self, num, suma, histograma, previo, puntuacion):
+        return {'num': num, 'suma': suma, 'histograma': list(histograma), 'previo': previo, 'puntuacion': puntuacion}
+
+    def _suavizar(self, num, suma, previo):
+        return (self.peso_previo * previo + suma) / (self.peso_previo + num)
+
+    def registrar(self, valoraciones, usuario=USUARIO_INVITADO):
+        # valoraciones: lista de dicts con tipo, objeto_id, restaurante_id, puntuacion,
+        # comentario y previo (valoración de catálogo usada como media a priori)
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock, self.bd.transaccion() as conexion:
+            nuevos = {}
+            for v in valoraciones:
+                clave = (v['tipo'], int(v['objeto_id']))
+                conexion.execute(
+                    "INSERT INTO valoraciones (tipo, objeto_id, restaurante_id, puntuacion, comentario, fecha, usuario) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (clave[0], clave[1], int(v['restaurante_id']), int(v['puntuacion']), v.get('comentario', ""), fecha,
+                     usuario))
+                actual = nuevos.get(clave) or self.agregados.get(clave) or self._agregado(0, 0, [0] * 5, float(v['previo']), 0.0)
+                histograma = list(actual['histograma'])
+                histograma[int(v['puntuacion']) - 1] += 1
+                num, suma = actual['num'] + 1, actual['suma'] + int(v['puntuacion'])
+                nuevos[clave] = self._agregado(num, suma, histograma, actual['previo'],
+                                               self._suavizar(num, suma, actual['previo']))
+            for clave, agregado in nuevos.items():
+                conexion.execute("INSERT OR REPLACE INTO agregados_valoraciones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (*clave, agregado['num'], agregado['suma'], *agregado['histograma'],
+                                  agregado['previo'], agregado['puntuacion']))
+            self.agregados.update(nuevos)
+
+    def puntuacion(self, tipo, objeto_id, por_defecto):
+        agregado = self.agregados.get((tipo, objeto_id))
+        return agregado['puntuacion'] if agregado else por_defecto
+
+    def num_valoraciones(self, tipo, objeto_id):
+        agregado = self.agregados.get((tipo, objeto_id))
+        return agregado['num'] if agregado else 0
+
+    def historial(self):
+        # (usuario, restaurante_id, puntuacion) de todas las valoraciones, de restaurante o de plato
+        with self.bd.conexion() as conexion:
+            return conexion.execute("SELECT usuario, restaurante_id, puntuacion FROM valoraciones ORDER BY id").fetchall()
+
+    def recalcular(self, previos, peso_previo=None, tamano_bloque=TAMANO_BLOQUE_RECALCULO):
+        # Reconstruye todos los agregados leyendo el registro por bloques, p. ej. al
+        # cambiar el peso del suavizado. previos: dict (tipo, objeto_id) -> valoración a priori.
+        # Todo el trabajo se hace con el lock y dentro de una transacción: una valoración
+        # registrada entre la lectura y el DELETE se perdería de los agregados.
+        with self.lock, self.bd.transaccion() as conexion:
+            if peso_previo is not None:
+                self.peso_previo = peso_previo
+            recuentos = {}
+            cursor = conexion.execute("SELECT tipo, objeto_id, puntuacion FROM valoraciones ORDER BY id")
+            while True:
+                bloque = cursor.fetchmany(tamano_bloque)
+                if not bloque:
+                    break
+                tabla = pd.DataFrame(bloque, columns=['tipo', 'objeto_id', 'puntuacion'])
+                parcial = pd.crosstab([tabla['tipo'], tabla['objeto_id']], tabla['puntuacion'])
+                for clave, fila in parcial.iterrows():
+                    histograma = recuentos.setdefault(clave, np.zeros(5, dtype=np.int64))
+                    for estrellas, cuenta in fila.items():
+                        histograma[int(estrellas) - 1] += int(cuenta)
+            agregados = {}
+            for clave, histograma in recuentos.items():
+                num, suma = int(histograma.sum()), int((histograma * np.arange(1, 6)).sum())
+                previo = float(previos.get(clave, self.agregados.get(clave, {}).get('previo', 0.0)))
+                agregados[clave] = self._agregado(num, suma, histograma.tolist(), previo, self._suavizar(num, suma, previo))
+            conexion.execute("DELETE FROM agregados_valoraciones")
+            conexion.executemany("INSERT INTO agregados_valoraciones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [(*clave, a['num'], a['suma'], *a['histograma'], a['previo'], a['puntuacion'])
+                                  for clave, a in agregados.items()])
+            self.agregados = agregados
+        return len(agregados)
+
+@st.cache_resource
+def obtener_repositorio_valoraciones():
+    return RepositorioValoraciones(obtener_base_datos())
+
+def previos_valoracion(restaurantes, platos):
+    previos = {('restaurante', int(i)): float(v) for i, v in zip(restaurantes['id'], restaurantes['valoracion'])}
+    previos.update({('plato', int(i)): float(v) for i, v in zip(platos['id'], platos['valoracion'])})
+    return previos
+
+# -----------------------------
+# Motor de disponibilidad de mesas
+# -----------------------------
+@st.cache_resource(max_entries=1)
+def obtener_motor_disponibilidad(hoy):
+    # Un calendario por día; al cambiar de día se reconstruye desde las reservas guardadas
+    motor = MotorDisponibilidad(hoy)
+    for _, reserva in obtener_repositorio_reservas().listar().iterrows():
+        motor.reservar(reserva['restaurante_id'], reserva['fecha'], reserva['num_personas'], forzar=True)
+    return motor
+
+# -----------------------------
+# Servicio de catálogo compartido
+# -----------------------------
+MAX_ALTAS_PENDIENTES = 1000  # altas en el registro antes de compactarlas en el .arrow
+
+class ServicioCatalogo:
+    # Catálogo único para todo el proceso con un número de versión que solo crece.
+    # Los restaurantes nuevos se añaden al final y sin platos; las estructuras derivadas
+    # (índices, tablas de consulta) se ponen al día una vez por versión y las baratas
+    # (tipos, límites de precio) se actualizan en el momento.
+    def __init__(self, restaurantes, platos, directorio=None):
+        # directorio: almacén Arrow donde se anexan las altas (None = solo en memoria)
+        self.lock = threading.Lock()
+        self.locks_derivados = {}
+        self.version = 0
+        self.directorio = directorio
+        self.altas_pendientes = contar_altas('restaurantes', directorio) if directorio is not None else 0
+        self.restaurantes = restaurantes.reset_index(drop=True)
+        self.platos = platos
+        self.tipos = sorted(self.restaurantes['tipo'].unique().tolist())
+        self.precio_limites = (int(self.restaurantes['precio_min'].min()), int(self.restaurantes['precio_max'].max()))
+        self._derivados = {}
+
+    def agregar_restaurante(self, datos):
+        with self.lock:
+            nuevo_id = int(self.restaurantes['id'].max()) + 1 if not self.restaurantes.empty else 1
+            lat, lon = geocodificar(datos['ubicacion'])
+            fila = pd.DataFrame([{**datos, 'id': nuevo_id, 'lat': lat, 'lon': lon}], columns=self.restaurantes.columns)
+            if self.directorio is not None:
+                # Se guarda en el registro de altas (con la misma validación que la importación)
+                # antes de publicarlo, para que sobreviva a un reinicio. El .arrow solo se
+                # reescribe cada MAX_ALTAS_PENDIENTES altas.
+                _, errores = anexar_altas('restaurantes', fila, self.directorio)
+                if errores:
+                    raise ValueError("; ".join(motivo for _, motivo in errores))
+                self.altas_pendientes += 1
+                if self.altas_pendientes >= MAX_ALTAS_PENDIENTES:
+                    compactar('restaurantes', self.directorio)
+                    self.altas_pendientes = 0
+            fila = tipar(fila, 'restaurantes')
+            self.restaurantes = pd.concat([self.restaurantes, fila], ignore_index=True)
+            if datos['tipo'] not in self.tipos:
+                bisect.insort(self.tipos, datos['tipo'])
+            self.precio_limites = (min(self.precio_limites[0], int(datos['precio_min'])),
+                                   max(self.precio_limites[1], int(datos['precio_max'])))
+            self.version += 1
+            return nuevo_id
+
+    def derivado(self, nombre, construir):
+        # Se trabaja sobre una instantánea fuera de self.lock, así las altas no esperan a
+        # los índices; el lock de cada derivado evita que varias sesiones repitan el
+        # trabajo. Si la versión anterior sabe anexar filas, se parchea en lugar de
+        # construir desde cero.
+        version, valor = self._derivados.get(nombre, (None, None))
+        if version == self.version:
+            return valor
+        with self.lock:
+            lock_derivado = self.locks_derivados.setdefault(nombre, threading.Lock())
+        with lock_derivado:
+            with self.lock:
+                version_actual, restaurantes, platos = self.version, self.restaurantes, self.platos
+            version, valor = self._derivados.get(nombre, (None, None))
+            if version != version_actual:
+                if hasattr(valor, 'anexar'):
+                    valor = valor.anexar(restaurantes)
+                else:
+                    valor = construir(restaurantes, platos)
+                self._derivados[nombre] = (version_actual, valor)
+        return valor
+
+@st.cache_resource
+def obtener_servicio_catalogo():
+    return ServicioCatalogo(cargar_restaurantes(), cargar_platos(), DIRECTORIO_CATALOGO)
+
+# -----------------------------
+# Recomendaciones ("Restaurantes para ti")
+# -----------------------------
+PESO_DISTANCIA_KM = 0.2  # penalización por km al ordenar por relevancia resultados geolocalizados
+CRITERIOS_ORDEN = ["Relevancia", "Distancia"]
+
+@st.cache_resource
+def obtener_motor_recomendaciones():
+    repositorio_valoraciones = obtener_repositorio_valoraciones()
+
+    def historial():
+        reservas = obtener_repositorio_reservas().listar()
+        eventos = [(propietario, restaurante_id, 1.0, 1)
+                   for propietario, restaurante_id in zip(reservas['propietario'], reservas['restaurante_id'].tolist())]
+        eventos += [(usuario, restaurante_id, peso_valoracion(puntuacion), 1)
+                    for usuario, restaurante_id, puntuacion in repositorio_valoraciones.historial()]
+        return eventos
+    return MotorRecomendaciones(historial, repositorio_valoraciones)
+
+# -----------------------------
+# Inicialización del estado de sesión
+# -----------------------------
+if 'busqueda' not in st.session_state:
+    st.session_state.busqueda = {}
+if 'pagina_resultados' not in st.session_state:
+    st.session_state.pagina_resultados = 0
 
 if 'active_reservation' not in st.session_state:
     st.session_state.active_reservation = None
@@ -117,42 +1069,127 @@ if 'modify_reservation' not in st.session_state:
 if 'new_reservation' not in st.session_state:
     st.session_state.new_reservation = False
 
-# Combinar restaurantes precargados y los agregados manualmente
-restaurantes_df = pd.concat([cargar_restaurantes(), st.session_state.nuevos_restaurantes], ignore_index=True)
-platos_df = cargar_platos()
+# Aún no hay cuentas: cada visitante recibe un identificador anónimo y aleatorio que se
+# guarda en la URL (?usuario=...), así conserva sus reservas al recargar o volver al enlace
+if 'usuario' not in st.session_state:
+    st.session_state.usuario = usuario_valido(st.query_params.get("usuario")) or uuid.uuid4().hex
+if st.query_params.get("usuario") != st.session_state.usuario:
+    st.query_params["usuario"] = st.session_state.usuario
+usuario_actual = st.session_state.usuario
+
+# Catálogo compartido entre sesiones: sin copias ni concat por rerun
+with perfilador.medir("carga_datos"):
+    servicio_catalogo = obtener_servicio_catalogo()
+    restaurantes_df = servicio_catalogo.restaurantes
+    platos_df = servicio_catalogo.platos
+    repositorio_reservas = obtener_repositorio_reservas()
+    motor_disponibilidad = obtener_motor_disponibilidad(date.today())
+    repositorio_valoraciones = obtener_repositorio_valoraciones()
+
+    # El índice y las tablas de consulta solo se reconstruyen cuando cambia la versión del catálogo
+    indice_restaurantes = servicio_catalogo.derivado('indice', IndiceRestaurantes)
+    catalogo = servicio_catalogo.derivado('tablas', TablasCatalogo)
+
+    # Índice de platos compartido; solo indexa los platos añadidos desde la última ejecución
+    indice_platos = obtener_indice_platos()
+    indice_platos.sincronizar(platos_df)
+
+    # Vectores de recomendación: solo se calculan los de restaurantes nuevos
+    motor_recomendaciones = obtener_motor_recomendaciones()
+    motor_recomendaciones.sincronizar(restaurantes_df, platos_df)
 
 # -----------------------------
 # Funciones auxiliares
 # -----------------------------
+TAMANOS_PAGINA = [5, 10, 20, 50]
+TAMANO_PAGINA = 10
+
+@perfilador.instrumentar
 def get_imagen_restaurante(restaurante_id):
-    np.random.seed(restaurante_id)
-    r = np.random.randint(100, 200)
-    g = np.random.randint(100, 200)
-    b = np.random.randint(100, 200)
-    img = Image.new('RGB', (400, 200), color=(r, g, b))
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
-
-def mostrar_menu_pdf(restaurante_id):
-    # Si se subió un PDF, se muestra incrustado en un iframe.
-    if restaurante_id in st.session_state.menu_pdfs:
-        pdf_bytes = st.session_state.menu_pdfs[restaurante_id]
-        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-        pdf_display = f'<iframe src="data:application/pdf;base64,{pdf_base64}" width="700" height="1000" type="application/pdf"></iframe>'
-        st.markdown(pdf_display, unsafe_allow_html=True)
+    # Bytes ya codificados; st.image los sirve por la ruta de medios en lugar de un data: URI
+    return obtener_cache_imagenes().obtener(restaurante_id)
+
+@perfilador.instrumentar
+def mostrar_menu_pdf(restaurante_id, completo=True):
+    # Si se subió un PDF, se muestra incrustado en un iframe que lo carga por URL;
+    # en la vista resumida solo se muestra la miniatura y el enlace. El menú simulado
+    # (varios elementos por plato) solo se pinta al pedir el menú completo.
+    almacen = obtener_almacen_pdf()
+    clave = almacen.menu(restaurante_id)
+    if clave is not None:
+        if completo:
+            pdf_display = f'<iframe src="{almacen.url(clave)}" width="700" height="1000" type="application/pdf"></iframe>'
+            st.markdown(pdf_display, unsafe_allow_html=True)
+        else:
+            miniatura = almacen.miniatura(clave)
+            if miniatura:
+                st.image(miniatura)
+            st.markdown(f"[Abrir menú en PDF]({almacen.url(clave)})")
+    elif not completo:
+        st.caption("Sin menú en PDF: pulsa «📋 Ver menú completo» para ver la carta a partir de sus platos.")
     else:
         # En caso de no existir un PDF, se muestra una simulación del menú a partir de los platos.
         st.info("No se encontró un PDF para este restaurante. Se muestra un menú simulado:")
-        platos_rest = platos_df[platos_df['restaurante_id'] == restaurante_id]
+        platos_rest = catalogo.platos(restaurante_id)
         if platos_rest.empty:
             st.warning("No se encontraron platos para este restaurante.")
         else:
             for _, plato in platos_rest.iterrows():
                 st.markdown(f"**{plato['nombre']}** - {plato['precio']}€")
-                st.markdown(f"*Tipo:* {plato['tipo']} | *Valoración:* {'⭐' * int(plato['valoracion'])}")
+                valoracion = repositorio_valoraciones.puntuacion('plato', plato['id'], plato['valoracion'])
+                st.markdown(f"*Tipo:* {plato['tipo']} | *Valoración:* {'⭐' * int(round(valoracion))}")
                 st.markdown("---")
 
+@perfilador.instrumentar
+def html_tarjeta_restaurante(rest, distancia=None):
+    # Toda la tarjeta (cabecera y platos destacados) en un único bloque HTML. Los textos
+    # del catálogo los escribe cualquier visitante al dar de alta un restaurante: se escapan.
+    partes = ["<div class='card'>"]
+    if rest['promocionado']:
+        partes.append("<div class='promocionado'>✨ PROMOCIONADO</div>")
+    valoracion = repositorio_valoraciones.puntuacion('restaurante', rest['id'], rest['valoracion'])
+    num_valoraciones = repositorio_valoraciones.num_valoraciones('restaurante', rest['id'])
+    opiniones = f" <small>({num_valoraciones} valoraciones)</small>" if num_valoraciones else ""
+    partes.append(f"<h3>{html.escape(rest['nombre'])} {'⭐' * int(round(valoracion))}{opiniones}</h3>")
+    a_distancia = f" ({distancia:.1f} km)" if distancia is not None else ""
+    partes.append(f"<p>📍 {html.escape(rest['ubicacion'])}{a_distancia} | 🍽️ {html.escape(str(rest['tipo']))} | "
+                  f"💰 {rest['precio_min']}€ - {rest['precio_max']}€</p>")
+    platos_rest = catalogo.platos(rest['id'])
+    if not platos_rest.empty:
+        partes.append("<h4>Platos destacados:</h4>")
+        for plato in platos_rest.itertuples():
+            promo = "✨ " if plato.promocionado else ""
+            estrellas = '⭐' * int(round(repositorio_valoraciones.puntuacion('plato', plato.id, plato.valoracion)))
+            partes.append(f"<div class='menu-item'>{promo}{html.escape(plato.nombre)} - {plato.precio}€ {estrellas} <small>{plato.etiquetas}</small></div>")
+    partes.append("</div>")
+    return "".join(partes)
+
+def ordenar_resultados(ids, puntos, afinidad, distancias, criterio):
+    # Siempre primero lo bien que coinciden sus platos con la búsqueda. Relevancia: después
+    # la afinidad con el usuario (preferencias, valoración y promoción) penalizada por la
+    # distancia. Distancia: después el más cercano, y la afinidad solo deshace empates.
+    if criterio == "Distancia":
+        orden = np.lexsort((-afinidad, distancias, -puntos))
+    else:
+        orden = np.lexsort((-(afinidad - PESO_DISTANCIA_KM * distancias), -puntos))
+    return ids[orden]
+
+def cambiar_pagina_resultados(paso, total_paginas):
+    st.session_state.pagina_resultados = max(0, min(st.session_state.pagina_resultados + paso, total_paginas - 1))
+
+@perfilador.instrumentar
+def mostrar_horarios_libres(restaurante_id, fecha, hora, num_personas):
+    libres = motor_disponibilidad.proximos_libres(restaurante_id, datetime.combine(fecha, hora), num_personas)
+    if libres:
+        st.caption("🕒 Próximos horarios disponibles: " + ", ".join(f.strftime("%d/%m %H:%M") for f in libres))
+    else:
+        st.caption("🕒 No hay horarios disponibles en los próximos días para ese número de personas.")
+
+def error_reserva(fecha_hora):
+    # Fuera del calendario o del horario se explica el motivo; si no, es que no hay sitio
+    st.error(motor_disponibilidad.motivo_rechazo(fecha_hora)
+             or "No hay mesas disponibles para esa fecha y hora. Prueba con otro horario.")
+
 def local_css():
     st.markdown("""
     <style>
@@ -207,6 +1244,25 @@ st.sidebar.title("La Cuchara")
 pagina = st.sidebar.radio("Navegación", ["Buscar Restaurantes", "Mis Reservas", "Valoraciones", "Agregar Restaurante"])
 st.sidebar.markdown("---")
 
+# Panel de administración (métricas y tareas de mantenimiento): solo visible con
+# ?admin=<token> cuando el token coincide con LA_CUCHARA_ADMIN; sin esa variable no se muestra
+TOKEN_ADMIN = os.environ.get("LA_CUCHARA_ADMIN", "")
+if TOKEN_ADMIN and hmac.compare_digest(st.query_params.get("admin", ""), TOKEN_ADMIN):
+    with st.sidebar.expander("⚙️ Métricas de rendimiento"):
+        metricas = perfilador.instantanea()
+        st.caption("Perfilado activo" if perfilador.activo else "Perfilado desactivado (LA_CUCHARA_PERFILADO=1)")
+        st.json(metricas)
+        if st.button("Guardar métricas en disco"):
+            perfilador.volcar()
+        if st.button("Recalcular valoraciones"):
+            total = repositorio_valoraciones.recalcular(previos_valoracion(restaurantes_df, platos_df))
+            st.caption(f"Agregados recalculados: {total}")
+        if st.button("Informe de memoria"):
+            st.dataframe(informe_memoria({'restaurantes': restaurantes_df, 'platos': platos_df,
+                                          'reservas': repositorio_reservas.listar()}), hide_index=True)
+
+inicio_pagina = time.perf_counter()
+
 # -----------------------------
 # Página: Buscar Restaurantes
 # -----------------------------
@@ -217,96 +1273,178 @@ if pagina == "Buscar Restaurantes":
     with col1:
         busqueda_plato = st.text_input("🍽️ Buscar plato", placeholder="Paella, sushi, pasta...")
         ubicacion = st.text_input("📍 Ubicación", placeholder="Barrio, calle, zona...")
+        radio_km = st.slider("📏 Distancia máxima (km)", 0.5, 10.0, 2.0, step=0.5)
+    # Búsqueda de platos (puntuaciones en caché por consulta) y ubicación: si es una calle
+    # o barrio conocido se busca por distancia; si no, se usa como texto sobre la dirección.
+    puntuacion_platos = indice_platos.puntuar_restaurantes(busqueda_plato) if busqueda_plato.strip() else None
+    ids_plato = None if puntuacion_platos is None else puntuacion_platos.index
+    lat, lon = geocodificar(ubicacion) if ubicacion.strip() else (np.nan, np.nan)
+    geolocalizada = not np.isnan(lat)
+    cerca = (lat, lon, radio_km) if geolocalizada else None
+    ubicacion_texto = "" if geolocalizada else ubicacion
+    # Recuentos de facetas con la selección actual (el estado de los widgets ya está
+    # actualizado al empezar el rerun), para mostrarlos junto a cada opción
+    precio_minimo, precio_maximo = servicio_catalogo.precio_limites
+    with perfilador.medir("facetas"):
+        facetas = indice_restaurantes.contar_facetas(
+            tipo=st.session_state.get('filtro_tipo', "Todos"),
+            solo_promocionados=st.session_state.get('filtro_promocionados', False),
+            precio=st.session_state.get('filtro_precio', (10, 25)),
+            opciones_menu=st.session_state.get('filtro_menu', ["Sin restricciones"]),
+            ids_plato=ids_plato, ubicacion=ubicacion_texto, cerca=cerca,
+        )
     with col2:
         tipo_restaurante = st.selectbox("👨‍🍳 Tipo de restaurante", 
-                                       ["Todos"] + sorted(restaurantes_df['tipo'].unique().tolist()))
-        rango_precio = st.slider("💰 Rango de precio (€)", 5, 40, (10, 25))
+                                       ["Todos"] + servicio_catalogo.tipos, key="filtro_tipo",
+                                       format_func=lambda t: f"{t} ({facetas['Todos'] if t == 'Todos' else facetas['tipo'].get(t, 0)})")
+        rango_precio = st.slider("💰 Rango de precio (€)", min(5, precio_minimo), max(40, precio_maximo), (10, 25),
+                                 key="filtro_precio")
+        st.caption("Precio típico: " + " · ".join(f"{tramo} ({n})" for tramo, n in facetas['tramo_precio'].items()))
     with col3:
         opciones_menu = st.multiselect("🍲 Tipo de menú", 
                                       ["Sin restricciones", "Celíaco", "Vegetariano", "Vegano"],
-                                      default=["Sin restricciones"])
-        solo_promocionados = st.checkbox("Ver solo restaurantes con promociones")
+                                      default=["Sin restricciones"], key="filtro_menu",
+                                      format_func=lambda o: f"{o} ({facetas['menu'][o]})")
+        solo_promocionados = st.checkbox(f"Ver solo restaurantes con promociones ({facetas['promocionado']})",
+                                         key="filtro_promocionados")
+    st.caption(f"{facetas['total']} restaurantes cumplen los filtros seleccionados")
+    criterio_orden = st.radio("↕️ Ordenar por", CRITERIOS_ORDEN, horizontal=True, key="orden_resultados")
     
     if st.button("🔍 Buscar restaurantes"):
-        st.markdown("<h2 class='subheader'>Resultados de búsqueda</h2>", unsafe_allow_html=True)
-        restaurantes_filtrados = restaurantes_df.copy()
-        if tipo_restaurante != "Todos":
-            restaurantes_filtrados = restaurantes_filtrados[restaurantes_filtrados['tipo'] == tipo_restaurante]
-        if solo_promocionados:
-            restaurantes_filtrados = restaurantes_filtrados[restaurantes_filtrados['promocionado'] == True]
-        restaurantes_filtrados = restaurantes_filtrados[
-            (restaurantes_filtrados['precio_min'] >= rango_precio[0]) & 
-            (restaurantes_filtrados['precio_max'] <= rango_precio[1])
-        ]
-        
-        for _, rest in restaurantes_filtrados.iterrows():
+        # La lista de ids se calcula una sola vez por consulta y se conserva entre reruns
+        clave_busqueda = (tipo_restaurante, solo_promocionados, tuple(rango_precio), tuple(opciones_menu),
+                          busqueda_plato.strip(), ubicacion.strip(), radio_km, servicio_catalogo.version)
+        if st.session_state.busqueda.get('clave') != clave_busqueda:
+            filtros = dict(
+                tipo=tipo_restaurante,
+                solo_promocionados=solo_promocionados,
+                precio=rango_precio,
+                opciones_menu=opciones_menu,
+                ids_plato=ids_plato
+            )
+            aviso = None
+            if geolocalizada:
+                filas = indice_restaurantes.buscar(cerca=cerca, **filtros)
+                if len(filas) == 0:
+                    filas = indice_restaurantes.mas_cercanos(lat, lon, 5, **filtros)
+                    if len(filas):
+                        aviso = f"No hay restaurantes a menos de {radio_km} km; se muestran los más cercanos."
+            else:
+                filas = indice_restaurantes.buscar(ubicacion=ubicacion, **filtros)
+            distancias = indice_restaurantes.distancias(filas, lat, lon) if geolocalizada else np.zeros(len(filas))
+            puntos = puntuacion_platos.reindex(indice_restaurantes.ids[filas]).to_numpy() \
+                if puntuacion_platos is not None else np.zeros(len(filas))
+            afinidad = motor_recomendaciones.puntuar(usuario_actual, filas)
+            ids_filas = indice_restaurantes.ids[filas]
+            # Se guardan las claves de orden para poder reordenar sin repetir la búsqueda
+            st.session_state.busqueda = {
+                'clave': clave_busqueda,
+                'candidatos': (ids_filas, puntos, afinidad, distancias),
+                'distancias': dict(zip(ids_filas.tolist(), distancias.tolist())) if geolocalizada else {},
+                'aviso': aviso
+            }
+        st.session_state.pagina_resultados = 0
+
+    busqueda = st.session_state.busqueda
+    if busqueda.get('candidatos') is not None and busqueda.get('criterio') != criterio_orden:
+        if busqueda.get('criterio') is not None:
+            st.session_state.pagina_resultados = 0
+        busqueda['ids'] = ordenar_resultados(*busqueda['candidatos'], criterio_orden)
+        busqueda['criterio'] = criterio_orden
+
+    if st.session_state.busqueda.get('ids') is None:
+        # Antes de la primera búsqueda se muestran las recomendaciones del usuario
+        with perfilador.medir("recomendaciones"):
+            ids_para_ti, _ = motor_recomendaciones.recomendar(usuario_actual)
+        if len(ids_para_ti):
+            st.markdown("<h2 class='subheader'>Restaurantes para ti</h2>", unsafe_allow_html=True)
+        for rest_id in ids_para_ti:
+            rest = catalogo.restaurante(rest_id)
             col_img, col_info = st.columns([1, 2])
             with col_img:
-                st.markdown(f"""
-                <div style="width:100%;height:200px;background-image:url(data:image/png;base64,{get_imagen_restaurante(rest['id'])});
-                background-size:cover;border-radius:10px;"></div>
-                """, unsafe_allow_html=True)
+                st.image(get_imagen_restaurante(rest['id']))
             with col_info:
-                st.markdown("<div class='card'>", unsafe_allow_html=True)
-                if rest['promocionado']:
-                    st.markdown("<div class='promocionado'>✨ PROMOCIONADO</div>", unsafe_allow_html=True)
-                st.markdown(f"<h3>{rest['nombre']} {'⭐' * int(rest['valoracion'])}</h3>", unsafe_allow_html=True)
-                st.markdown(f"<p>📍 {rest['ubicacion']} | 🍽️ {rest['tipo']} | 💰 {rest['precio_min']}€ - {rest['precio_max']}€</p>", unsafe_allow_html=True)
-                
-                # Mostrar platos destacados
-                platos_rest = platos_df[platos_df['restaurante_id'] == rest['id']]
-                if not platos_rest.empty:
-                    st.markdown("<h4>Platos destacados:</h4>", unsafe_allow_html=True)
-                    for _, plato in platos_rest.iterrows():
-                        promo = "✨ " if plato['promocionado'] else ""
-                        etiquetas = []
-                        if plato['celiaco']: etiquetas.append("Sin gluten")
-                        if plato['vegetariano']: etiquetas.append("Vegetariano")
-                        if plato['vegano']: etiquetas.append("Vegano")
-                        etiquetas_text = f" ({', '.join(etiquetas)})" if etiquetas else ""
-                        st.markdown(f"<div class='menu-item'>{promo}{plato['nombre']} - {plato['precio']}€ {'⭐' * int(plato['valoracion'])} <small>{etiquetas_text}</small></div>", unsafe_allow_html=True)
-                
-                # Sección de información adicional
-                with st.expander("Más información"):
-                    if rest['descripcion']:
-                        st.markdown(f"**Descripción:** {rest['descripcion']}")
-                    else:
-                        st.markdown("No hay información adicional.")
-                    st.markdown("**Menú PDF:**")
-                    mostrar_menu_pdf(rest['id'])
-                
-                col_accion1, col_accion2 = st.columns(2)
-                with col_accion1:
-                    if st.button("📅 Reservar mesa", key=f"reservar_{rest['id']}"):
-                        st.session_state.active_reservation = rest['id']
-                with col_accion2:
-                    if st.button("📋 Ver menú completo", key=f"menu_{rest['id']}"):
-                        mostrar_menu_pdf(rest['id'])
-                st.markdown("</div>", unsafe_allow_html=True)
-            st.markdown("---")
-    
+                st.markdown(html_tarjeta_restaurante(rest), unsafe_allow_html=True)
+                if st.button("📅 Reservar mesa", key=f"para_ti_{rest['id']}"):
+                    st.session_state.active_reservation = rest['id']
+
+    if st.session_state.busqueda.get('ids') is not None:
+        st.markdown("<h2 class='subheader'>Resultados de búsqueda</h2>", unsafe_allow_html=True)
+        ids_resultado = st.session_state.busqueda['ids']
+        if len(ids_resultado) == 0:
+            st.info("No se encontraron restaurantes con esos criterios.")
+        else:
+            tamano_pagina = st.selectbox("Resultados por página", TAMANOS_PAGINA,
+                                         index=TAMANOS_PAGINA.index(TAMANO_PAGINA), key="tamano_pagina")
+            total_paginas = (len(ids_resultado) - 1) // tamano_pagina + 1
+            pagina_actual = min(st.session_state.pagina_resultados, total_paginas - 1)
+            st.caption(f"{len(ids_resultado)} restaurantes encontrados · página {pagina_actual + 1} de {total_paginas}")
+            if st.session_state.busqueda.get('aviso'):
+                st.info(st.session_state.busqueda['aviso'])
+
+            # Solo se generan widgets para la página visible
+            for rest_id in ids_resultado[pagina_actual * tamano_pagina:(pagina_actual + 1) * tamano_pagina]:
+                rest = catalogo.restaurante(rest_id)
+                col_img, col_info = st.columns([1, 2])
+                with col_img:
+                    st.image(get_imagen_restaurante(rest['id']))
+                with col_info:
+                    st.markdown(html_tarjeta_restaurante(rest, st.session_state.busqueda['distancias'].get(rest_id)),
+                                unsafe_allow_html=True)
+
+                    # Sección de información adicional
+                    with st.expander("Más información"):
+                        if rest['descripcion']:
+                            st.markdown(f"**Descripción:** {rest['descripcion']}")
+                        else:
+                            st.markdown("No hay información adicional.")
+                        st.markdown("**Menú PDF:**")
+                        mostrar_menu_pdf(rest['id'], completo=False)
+
+                    col_accion1, col_accion2 = st.columns(2)
+                    with col_accion1:
+                        if st.button("📅 Reservar mesa", key=f"reservar_{rest['id']}"):
+                            st.session_state.active_reservation = rest['id']
+                    with col_accion2:
+                        if st.button("📋 Ver menú completo", key=f"menu_{rest['id']}"):
+                            mostrar_menu_pdf(rest['id'])
+                st.markdown("---")
+
+            col_anterior, col_siguiente = st.columns(2)
+            with col_anterior:
+                st.button("◀ Anterior", on_click=cambiar_pagina_resultados, args=(-1, total_paginas),
+                          disabled=pagina_actual == 0)
+            with col_siguiente:
+                st.button("Siguiente ▶", on_click=cambiar_pagina_resultados, args=(1, total_paginas),
+                          disabled=pagina_actual >= total_paginas - 1)
+
     if st.session_state.active_reservation is not None:
         rest_id = st.session_state.active_reservation
-        rest_sel = restaurantes_df[restaurantes_df['id'] == rest_id].iloc[0]
-        st.markdown(f"<h2 class='subheader'>Reservar en {rest_sel['nombre']}</h2>", unsafe_allow_html=True)
+        rest_sel = catalogo.restaurante(rest_id)
+        st.markdown(f"<h2 class='subheader'>Reservar en {html.escape(rest_sel['nombre'])}</h2>", unsafe_allow_html=True)
         fecha = st.date_input("Selecciona la fecha", min_value=datetime.now().date(), value=datetime.now().date() + timedelta(days=1))
-        hora = st.time_input("Selecciona la hora", value=datetime.now().time().replace(second=0, microsecond=0))
+        hora = st.time_input("Selecciona la hora", value=datetime.strptime(HORA_POR_DEFECTO, "%H:%M").time())
         num_personas = st.number_input("Número de personas", min_value=1, max_value=20, value=2, step=1)
+        mostrar_horarios_libres(rest_id, fecha, hora, num_personas)
         comentario = st.text_area("Comentario o petición especial (opcional)")
         if st.button("Confirmar Reserva", key=f"confirma_{rest_id}"):
-            nuevo_id = st.session_state.reservas_df['id'].max() + 1 if not st.session_state.reservas_df.empty else 1
             nueva_reserva = {
-                'id': nuevo_id,
                 'restaurante_id': rest_id,
                 'fecha': datetime.combine(fecha, hora),
                 'hora': hora.strftime("%H:%M"),
                 'num_personas': num_personas,
-                'platos': "",
-                'estado': 'Confirmada'
+                'platos': [],
+                'estado': 'Confirmada',
+                'comentario': comentario,
+                'propietario': usuario_actual
             }
-            st.session_state.reservas_df = st.session_state.reservas_df.append(nueva_reserva, ignore_index=True)
-            st.success(f"Reserva confirmada en {rest_sel['nombre']} para el {fecha.strftime('%d/%m/%Y')} a las {hora.strftime('%H:%M')}")
-            st.session_state.active_reservation = None
+            if motor_disponibilidad.reservar(rest_id, nueva_reserva['fecha'], num_personas):
+                repositorio_reservas.crear(nueva_reserva)
+                motor_recomendaciones.registrar_reserva(usuario_actual, rest_id)
+                st.success(f"Reserva confirmada en {rest_sel['nombre']} para el {fecha.strftime('%d/%m/%Y')} a las {hora.strftime('%H:%M')}")
+                st.session_state.active_reservation = None
+            else:
+                error_reserva(nueva_reserva['fecha'])
 
 # -----------------------------
 # Página: Mis Reservas
@@ -319,69 +1457,92 @@ elif pagina == "Mis Reservas":
 
     if st.session_state.new_reservation:
         st.markdown("<h2 class='subheader'>Crear nueva reserva</h2>", unsafe_allow_html=True)
-        rest_options = restaurantes_df[['id', 'nombre']]
-        rest_seleccion = st.selectbox("Selecciona un restaurante", options=rest_options['id'], format_func=lambda x: rest_options[rest_options['id'] == x]['nombre'].values[0])
+        rest_seleccion = st.selectbox("Selecciona un restaurante", options=restaurantes_df['id'], format_func=lambda x: catalogo.restaurante(x)['nombre'])
         fecha = st.date_input("Selecciona la fecha", min_value=datetime.now().date(), value=datetime.now().date() + timedelta(days=1))
-        hora = st.time_input("Selecciona la hora", value=datetime.now().time().replace(second=0, microsecond=0))
+        hora = st.time_input("Selecciona la hora", value=datetime.strptime(HORA_POR_DEFECTO, "%H:%M").time())
         num_personas = st.number_input("Número de personas", min_value=1, max_value=20, value=2, step=1)
+        mostrar_horarios_libres(rest_seleccion, fecha, hora, num_personas)
         comentario = st.text_area("Comentario o petición especial (opcional)")
         if st.button("Confirmar Reserva", key="confirma_nueva"):
-            nuevo_id = st.session_state.reservas_df['id'].max() + 1 if not st.session_state.reservas_df.empty else 1
             nueva_reserva = {
-                'id': nuevo_id,
                 'restaurante_id': rest_seleccion,
                 'fecha': datetime.combine(fecha, hora),
                 'hora': hora.strftime("%H:%M"),
                 'num_personas': num_personas,
-                'platos': "",
-                'estado': 'Confirmada'
+                'platos': [],
+                'estado': 'Confirmada',
+                'comentario': comentario,
+                'propietario': usuario_actual
             }
-            st.session_state.reservas_df = st.session_state.reservas_df.append(nueva_reserva, ignore_index=True)
-            nombre_rest = restaurantes_df[restaurantes_df['id'] == rest_seleccion]['nombre'].values[0]
-            st.success(f"Reserva confirmada en {nombre_rest} para el {fecha.strftime('%d/%m/%Y')} a las {hora.strftime('%H:%M')}")
-            st.session_state.new_reservation = False
+            if motor_disponibilidad.reservar(rest_seleccion, nueva_reserva['fecha'], num_personas):
+                repositorio_reservas.crear(nueva_reserva)
+                motor_recomendaciones.registrar_reserva(usuario_actual, rest_seleccion)
+                nombre_rest = catalogo.restaurante(rest_seleccion)['nombre']
+                st.success(f"Reserva confirmada en {nombre_rest} para el {fecha.strftime('%d/%m/%Y')} a las {hora.strftime('%H:%M')}")
+                st.session_state.new_reservation = False
+            else:
+                error_reserva(nueva_reserva['fecha'])
 
-    if st.session_state.reservas_df.empty:
+    reservas_df = repositorio_reservas.listar(usuario_actual)
+    if reservas_df.empty:
         st.info("No tienes reservas activas")
     else:
-        for idx, reserva in st.session_state.reservas_df.iterrows():
-            rest = restaurantes_df[restaurantes_df['id'] == reserva['restaurante_id']].iloc[0]
+        for idx, reserva in reservas_df.iterrows():
+            rest = catalogo.restaurante(reserva['restaurante_id'])
             st.markdown("<div class='card'>", unsafe_allow_html=True)
             col1, col2, col3 = st.columns([3, 1, 1])
             with col1:
                 fecha_str = reserva['fecha'].strftime("%d/%m/%Y")
-                st.markdown(f"<h3>{rest['nombre']}</h3>", unsafe_allow_html=True)
+                st.markdown(f"<h3>{html.escape(rest['nombre'])}</h3>", unsafe_allow_html=True)
                 st.markdown(f"<p>📅 {fecha_str} a las {reserva['hora']} | 👥 {reserva['num_personas']} personas</p>", unsafe_allow_html=True)
-                st.markdown(f"<p>📍 {rest['ubicacion']}</p>", unsafe_allow_html=True)
+                st.markdown(f"<p>📍 {html.escape(rest['ubicacion'])}</p>", unsafe_allow_html=True)
                 st.markdown("<h4>Platos reservados:</h4>", unsafe_allow_html=True)
-                for plato in reserva['platos'].split(", "):
-                    if plato:
-                        st.markdown(f"<div class='menu-item'>{plato}</div>", unsafe_allow_html=True)
+                for plato_id in reserva['platos']:
+                    st.markdown(f"<div class='menu-item'>{html.escape(catalogo.plato(plato_id)['nombre'])}</div>", unsafe_allow_html=True)
                 st.markdown(f"<p><b>Estado:</b> {reserva['estado']}</p>", unsafe_allow_html=True)
             with col2:
                 if st.button("✏️ Modificar", key=f"mod_{reserva['id']}"):
                     st.session_state.modify_reservation = reserva['id']
             with col3:
                 if st.button("❌ Cancelar", key=f"canc_{reserva['id']}"):
-                    st.session_state.reservas_df = st.session_state.reservas_df[st.session_state.reservas_df['id'] != reserva['id']]
-                    st.warning("Reserva cancelada")
+                    if cancelar_reserva(repositorio_reservas, motor_disponibilidad, reserva, usuario_actual):
+                        motor_recomendaciones.registrar_reserva(usuario_actual, reserva['restaurante_id'], cancelada=True)
+                        st.warning("Reserva cancelada")
+                    else:
+                        st.warning("La reserva ya estaba cancelada")
             st.markdown("</div>", unsafe_allow_html=True)
 
     if st.session_state.modify_reservation is not None:
         res_id = st.session_state.modify_reservation
-        reserva_actual = st.session_state.reservas_df[st.session_state.reservas_df['id'] == res_id].iloc[0]
-        rest_mod = restaurantes_df[restaurantes_df['id'] == reserva_actual['restaurante_id']].iloc[0]
-        st.markdown(f"<h2 class='subheader'>Modificar reserva en {rest_mod['nombre']}</h2>", unsafe_allow_html=True)
+        reserva_actual = repositorio_reservas.obtener(res_id, usuario_actual)
+        if reserva_actual is None or reserva_actual['estado'] == 'Cancelada':
+            # Otra sesión la ha cancelado mientras tanto
+            st.warning("La reserva ya no está activa")
+            st.session_state.modify_reservation = None
+    if st.session_state.modify_reservation is not None:
+        rest_mod = catalogo.restaurante(reserva_actual['restaurante_id'])
+        st.markdown(f"<h2 class='subheader'>Modificar reserva en {html.escape(rest_mod['nombre'])}</h2>", unsafe_allow_html=True)
         fecha_mod = st.date_input("Fecha", value=reserva_actual['fecha'].date(), key="fecha_mod")
         hora_mod = st.time_input("Hora", value=datetime.strptime(reserva_actual['hora'], "%H:%M").time(), key="hora_mod")
-        num_personas_mod = st.number_input("Número de personas", min_value=1, max_value=20, value=reserva_actual['num_personas'], step=1, key="num_mod")
+        num_personas_mod = st.number_input("Número de personas", min_value=1, max_value=20, value=int(reserva_actual['num_personas']), step=1, key="num_mod")
+        mostrar_horarios_libres(reserva_actual['restaurante_id'], fecha_mod, hora_mod, num_personas_mod)
         if st.button("Guardar cambios", key="guardar_mod"):
-            idx_mod = st.session_state.reservas_df.index[st.session_state.reservas_df['id'] == res_id][0]
-            st.session_state.reservas_df.at[idx_mod, 'fecha'] = datetime.combine(fecha_mod, hora_mod)
-            st.session_state.reservas_df.at[idx_mod, 'hora'] = hora_mod.strftime("%H:%M")
-            st.session_state.reservas_df.at[idx_mod, 'num_personas'] = num_personas_mod
-            st.success("Reserva modificada correctamente")
-            st.session_state.modify_reservation = None
+            fecha_hora_mod = datetime.combine(fecha_mod, hora_mod)
+            if not motor_disponibilidad.mover(reserva_actual['restaurante_id'], reserva_actual['fecha'],
+                                              reserva_actual['num_personas'], fecha_hora_mod, num_personas_mod):
+                error_reserva(fecha_hora_mod)
+            elif repositorio_reservas.modificar(res_id, usuario_actual, fecha_hora_mod,
+                                                hora_mod.strftime("%H:%M"), num_personas_mod):
+                st.success("Reserva modificada correctamente")
+                st.session_state.modify_reservation = None
+            else:
+                # Se canceló entre la lectura y el guardado: la cancelación ya liberó las
+                # plazas anteriores, así que se deshace el movimiento
+                motor_disponibilidad.liberar(reserva_actual['restaurante_id'], fecha_hora_mod, num_personas_mod)
+                motor_disponibilidad.reservar(reserva_actual['restaurante_id'], reserva_actual['fecha'],
+                                              reserva_actual['num_personas'], forzar=True)
+                st.warning("La reserva ya no está activa")
+                st.session_state.modify_reservation = None
 
 # -----------------------------
 # Página: Valoraciones
@@ -389,11 +1550,11 @@ elif pagina == "Mis Reservas":
 elif pagina == "Valoraciones":
     st.markdown("<h1 class='main-header'>Valorar mi experiencia</h1>", unsafe_allow_html=True)
     restaurante_id = 1  # Simulación: se valora un restaurante ya visitado
-    rest = restaurantes_df[restaurantes_df['id'] == restaurante_id].iloc[0]
-    platos_rest = platos_df[platos_df['restaurante_id'] == restaurante_id]
+    rest = catalogo.restaurante(restaurante_id)
+    platos_rest = catalogo.platos(restaurante_id)
     
     st.markdown("<div class='card'>", unsafe_allow_html=True)
-    st.markdown(f"<h3>Valorar visita a {rest['nombre']}</h3>", unsafe_allow_html=True)
+    st.markdown(f"<h3>Valorar visita a {html.escape(rest['nombre'])}</h3>", unsafe_allow_html=True)
     st.markdown("<p>Visitado el 26/02/2025</p>", unsafe_allow_html=True)
     
     st.markdown("<h4>Valoración general del restaurante:</h4>", unsafe_allow_html=True)
@@ -403,18 +1564,28 @@ elif pagina == "Valoraciones":
                                       placeholder="Comparte tu experiencia en este restaurante...")
     
     st.markdown("<h4>Valorar platos consumidos:</h4>", unsafe_allow_html=True)
+    valoraciones = [{
+        'tipo': 'restaurante', 'objeto_id': restaurante_id, 'restaurante_id': restaurante_id,
+        'puntuacion': valoracion_general, 'comentario': comentario_general, 'previo': rest['valoracion']
+    }]
     for _, plato in platos_rest.head(3).iterrows():
         col1, col2 = st.columns([1, 2])
         with col1:
-            st.markdown(f"<p><b>{plato['nombre']}</b></p>", unsafe_allow_html=True)
+            st.markdown(f"<p><b>{html.escape(plato['nombre'])}</b></p>", unsafe_allow_html=True)
             valoracion_plato = st.slider("", 1, 5, 4, key=f"val_plato_{plato['id']}")
             st.write(f"{'⭐' * valoracion_plato}")
         with col2:
-            st.text_area("Comentario", placeholder=f"¿Qué te pareció el {plato['nombre'].lower()}?", 
-                          key=f"com_plato_{plato['id']}")
+            comentario_plato = st.text_area("Comentario", placeholder=f"¿Qué te pareció el {plato['nombre'].lower()}?", 
+                                            key=f"com_plato_{plato['id']}")
+        valoraciones.append({
+            'tipo': 'plato', 'objeto_id': plato['id'], 'restaurante_id': restaurante_id,
+            'puntuacion': valoracion_plato, 'comentario': comentario_plato, 'previo': plato['valoracion']
+        })
     st.markdown("</div>", unsafe_allow_html=True)
     
     if st.button("📤 Enviar valoraciones"):
+        repositorio_valoraciones.registrar(valoraciones, usuario_actual)
+        motor_recomendaciones.registrar_valoraciones(usuario_actual, valoraciones)
         st.success("¡Gracias por tus valoraciones! Se han guardado correctamente.")
 
 # -----------------------------
@@ -427,7 +1598,7 @@ elif pagina == "Agregar Restaurante":
     nombre = st.text_input("Nombre del restaurante")
     valoracion = st.number_input("Valoración (1-5)", min_value=1.0, max_value=5.0, value=4.0, step=0.1)
     ubicacion = st.text_input("Ubicación")
-    tipo = st.selectbox("Tipo de cocina", ["Mediterráneo", "Asiático", "Italiano", "Español", "Vegetariano", "Otro"])
+    tipo = st.selectbox("Tipo de cocina", TIPOS_COCINA)
     precio_min = st.number_input("Precio mínimo (€)", min_value=1, value=10)
     precio_max = st.number_input("Precio máximo (€)", min_value=1, value=25)
     promocionado = st.checkbox("Restaurante promocionado")
@@ -436,12 +1607,11 @@ elif pagina == "Agregar Restaurante":
     menu_vegetariano = st.checkbox("Menú vegetariano")
     menu_vegano = st.checkbox("Menú vegano")
     descripcion = st.text_area("Descripción o información adicional", placeholder="Escribe una breve descripción del restaurante...")
+    foto = st.file_uploader("Subir foto del restaurante", type=["png", "jpg", "jpeg"])
     pdf_menu = st.file_uploader("Subir menú en PDF", type=["pdf"])
     
     if st.button("Agregar Restaurante"):
-        nuevo_id = restaurantes_df['id'].max() + 1 if not restaurantes_df.empty else 1
         nuevo_rest = {
-            'id': nuevo_id,
             'nombre': nombre,
             'valoracion': valoracion,
             'ubicacion': ubicacion,
@@ -455,12 +1625,34 @@ elif pagina == "Agregar Restaurante":
             'menu_vegano': menu_vegano,
             'descripcion': descripcion
         }
-        st.session_state.nuevos_restaurantes = st.session_state.nuevos_restaurantes.append(nuevo_rest, ignore_index=True)
-        if pdf_menu is not None:
-            st.session_state.menu_pdfs[nuevo_id] = pdf_menu.read()
-        st.success(f"Restaurante '{nombre}' agregado exitosamente.")
+        try:
+            nuevo_id = servicio_catalogo.agregar_restaurante(nuevo_rest)
+        except ValueError as error:
+            # Datos que el almacén no admite (nombre vacío, precio mínimo mayor que el máximo...)
+            st.error(f"No se pudo agregar el restaurante: {error}")
+        else:
+            if foto is not None:
+                # El restaurante ya está guardado: una imagen corrupta no debe impedir guardar el menú
+                try:
+                    obtener_cache_imagenes().guardar_foto(nuevo_id, foto.read())
+                except Exception as error:
+                    st.warning(f"El restaurante se ha guardado, pero no se pudo procesar la foto: {error}")
+            if pdf_menu is not None:
+                almacen = obtener_almacen_pdf()
+                clave = almacen.guardar(pdf_menu)
+                almacen.asignar(nuevo_id, clave)
+                try:
+                    almacen.generar_miniatura(clave)
+                except Exception as error:
+                    st.warning(f"El menú se ha guardado, pero no se pudo generar su miniatura: {error}")
+            st.success(f"Restaurante '{nombre}' agregado exitosamente.")
+
+if perfilador.local.midiendo:
+    perfilador.registrar(f"pagina:{pagina}", time.perf_counter() - inicio_pagina)
 
 # -----------------------------
 # Pie de página
 # -----------------------------
 st.markdown("<div class='footer'>© 2025 La Cuchara Restauración SL. Todos los derechos reservados.</div>", unsafe_allow_html=True)
+
+perfilador.finalizar_rerun()
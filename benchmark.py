@@ -0,0 +1,497 @@
+# Banco de pruebas de carga: ejecuta app.py sin navegador con streamlit.testing (AppTest).
+#
+# Para cada tamaño de catálogo se genera un catálogo sintético (10 platos por restaurante)
+# en un directorio temporal (LA_CUCHARA_DATOS, también para los PDF de las altas con
+# LA_CUCHARA_MENUS, así no quedan en static/menus) y, en un proceso aparte, N sesiones
+# simuladas recorren en paralelo los flujos principales: búsqueda con filtros, reserva,
+# modificación y cancelación en "Mis Reservas", alta de restaurante con PDF y valoraciones.
+# Se mide la latencia de cada rerun (p50/p95/p99), el pico de memoria (RSS) y el tamaño
+# del payload emitido, y se compara con la línea base guardada. Uso:
+#
+#     python benchmark.py --restaurantes 1000 --sesiones 4
+#     python benchmark.py --restaurantes 100 1000 10000 100000 --sesiones 8 --iteraciones 3
+#     python benchmark.py --guardar-base          # actualiza benchmark_base.json
+#
+# Los reruns se ejecutan de uno en uno (ver LOCK_APPTEST): las latencias son las de
+# reruns en serie con sesiones intercaladas, no p95/p99 de peticiones concurrentes.
+#
+# La línea base son tiempos absolutos y solo valen en la máquina que los midió:
+# benchmark_base.json no se versiona y guarda una entrada por máquina (--maquina, por
+# defecto nombre de host, arquitectura y número de CPU). Sale con código 1 si alguna
+# métrica empeora más de --tolerancia respecto a la base de esta máquina.
+#
+# Además mide por separado el pintado de una página de tarjetas según crece el número de
+# platos (tablas de consulta frente al escaneo de DataFrames anterior):
+#
+#     python benchmark.py --pintado --platos 10000 100000 1000000
+#
+# y la escritura concurrente de reservas contra SQLite (altas, cambios y cancelaciones de
+# varios propietarios a la vez); falla si hay ids perdidos o repetidos, si un propietario
+# ve o cambia reservas ajenas o si no se alcanzan --min-escrituras por segundo:
+#
+#     python benchmark.py --reservas --hilos 16 --escrituras 200
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+RUTA_APP = os.path.join(RAIZ, "app.py")
+RUTA_BASE = os.path.join(RAIZ, "benchmark_base.json")
+RUTA_SALIDA = os.path.join(RAIZ, "bench_output.txt")
+PLATOS_POR_RESTAURANTE = 10
+# AppTest cambia estado global del proceso en cada run (Runtime._instance y la opción
+# global.appTest), así que los reruns de las sesiones se serializan con este lock. Las
+# sesiones siguen intercalándose y compartiendo cachés como en un servidor real; la
+# espera por el lock se informa aparte de la latencia del rerun.
+LOCK_APPTEST = threading.Lock()
+# Métricas comparadas con la base: todas son "más es peor"
+METRICAS_BASE = ['p50_ms', 'p95_ms', 'p99_ms', 'payload_max_bytes', 'rss_por_sesion_mb']
+MAQUINA = f"{platform.node()}-{platform.machine()}-{os.cpu_count()}cpu"
+
+# -----------------------------
+# Datos sintéticos
+# -----------------------------
+def preparar_catalogo(directorio, restaurantes):
+    # Se importa con el mismo código que usa la CLI de catalogo.py; las coordenadas se
+    # dispersan alrededor de la calle para que la rejilla espacial no quede en un punto
+    from catalogo import asegurar_tabla, geocodificar, platos_sinteticos, restaurantes_sinteticos
+    rng = np.random.default_rng(0)
+    tabla = restaurantes_sinteticos(restaurantes)
+    coordenadas = np.array([geocodificar(u) for u in tabla['ubicacion']], dtype=float)
+    tabla['lat'] = coordenadas[:, 0] + rng.normal(0, 0.01, restaurantes)
+    tabla['lon'] = coordenadas[:, 1] + rng.normal(0, 0.01, restaurantes)
+    directorio_catalogo = os.path.join(directorio, "catalogo")
+    asegurar_tabla('restaurantes', tabla, directorio_catalogo)
+    asegurar_tabla('platos', platos_sinteticos(restaurantes, PLATOS_POR_RESTAURANTE), directorio_catalogo)
+
+def pdf_minimo(texto="Menu del dia"):
+    # PDF de una página válido (con tabla xref) para el alta con menú
+    contenido = f"BT /F1 18 Tf 72 720 Td ({texto}) Tj ET".encode()
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    posiciones = []
+    for i, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(pdf))
+        pdf += b"%d 0 obj\n" % i + objeto + b"\nendobj\n"
+    inicio_xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % p for p in posiciones)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref)
+    return pdf
+
+# -----------------------------
+# Sesiones simuladas
+# -----------------------------
+def _bytes_payload(nodo):
+    # Suma de los protos de todos los elementos del árbol renderizado
+    proto = getattr(nodo, 'proto', None)
+    total = proto.ByteSize() if proto is not None else 0
+    for hijo in getattr(nodo, 'children', {}).values():
+        total += _bytes_payload(hijo)
+    return total
+
+class Sesion:
+    def __init__(self, numero, semilla):
+        from streamlit.testing.v1 import AppTest
+        self.numero = numero
+        self.rng = np.random.default_rng(semilla)
+        self.at = AppTest.from_file(RUTA_APP, default_timeout=300)
+        self.medidas = []
+        self.errores = []
+
+    def paso(self, flujo, accion):
+        llegada = time.perf_counter()
+        with LOCK_APPTEST:
+            inicio = time.perf_counter()
+            accion()
+            segundos = time.perf_counter() - inicio
+        self.medidas.append((flujo, segundos, inicio - llegada, _bytes_payload(self.at._tree)))
+        if self.at.exception:
+            self.errores.append(f"{flujo}: {self.at.exception[0].message}")
+
+    def boton(self, prefijo_clave=None, etiqueta=None):
+        for boton in self.at.button:
+            if (prefijo_clave and (boton.key or "").startswith(prefijo_clave)) or (etiqueta and boton.label == etiqueta):
+                return boton
+        return None
+
+    def ir_a(self, flujo, pagina):
+        self.paso(flujo, lambda: self.at.sidebar.radio[0].set_value(pagina).run())
+
+    def buscar(self):
+        at = self.at
+        self.ir_a('buscar', "Buscar Restaurantes")
+        tipos = at.selectbox(key="filtro_tipo").options
+        # Las opciones se muestran con su recuento ("Italiano (12)"); el valor es el nombre
+        tipo = tipos[self.rng.integers(len(tipos))].rsplit(" (", 1)[0]
+        self.paso('buscar', lambda: at.selectbox(key="filtro_tipo").set_value(tipo).run())
+        menu = list(self.rng.choice(["Sin restricciones", "Celíaco", "Vegetariano", "Vegano"],
+                                    self.rng.integers(1, 3), replace=False))
+        self.paso('buscar', lambda: at.multiselect(key="filtro_menu").set_value(menu).run())
+        minimo = int(self.rng.integers(5, 20))
+        self.paso('buscar', lambda: at.slider(key="filtro_precio").set_value((minimo, minimo + 20)).run())
+        if self.rng.random() < 0.3:
+            self.paso('buscar', lambda: at.checkbox(key="filtro_promocionados").check().run())
+        if self.rng.random() < 0.5:
+            self.paso('buscar', lambda: at.text_input[1].set_value("Gran Vía").run())
+        if self.rng.random() < 0.5:
+            self.paso('buscar', lambda: at.text_input[0].set_value("paella").run())
+        self.paso('buscar', lambda: self.boton(etiqueta="🔍 Buscar restaurantes").click().run())
+        siguiente = self.boton(etiqueta="Siguiente ▶")
+        if siguiente is not None and not siguiente.disabled:
+            self.paso('buscar', lambda: siguiente.click().run())
+
+    def reservar(self):
+        reservar = self.boton(prefijo_clave="reservar_")
+        if reservar is None:
+            return
+        self.paso('reservar', lambda: reservar.click().run())
+        dia = date.today() + timedelta(days=int(self.rng.integers(1, 30)))
+        self.paso('reservar', lambda: self.at.date_input[0].set_value(dia).run())
+        confirmar = self.boton(prefijo_clave="confirma_")
+        if confirmar is not None:
+            self.paso('reservar', lambda: confirmar.click().run())
+
+    def mis_reservas(self):
+        self.ir_a('mis_reservas', "Mis Reservas")
+        modificar = self.boton(prefijo_clave="mod_")
+        if modificar is not None:
+            self.paso('mis_reservas', lambda: modificar.click().run())
+            if self.boton(prefijo_clave="guardar_mod") is not None:
+                personas = int(self.rng.integers(1, 8))
+                self.paso('mis_reservas', lambda: self.at.number_input(key="num_mod").set_value(personas).run())
+                self.paso('mis_reservas', lambda: self.boton(prefijo_clave="guardar_mod").click().run())
+        # Cada sesión es un visitante distinto y solo ve sus propias reservas
+        cancelar = [b for b in self.at.button if (b.key or "").startswith("canc_")]
+        if cancelar:
+            self.paso('mis_reservas', lambda: cancelar[-1].click().run())
+
+    def agregar(self):
+        at = self.at
+        self.ir_a('agregar', "Agregar Restaurante")
+        self.paso('agregar', lambda: at.text_input[0].set_value(f"Alta {self.numero}").run())
+        self.paso('agregar', lambda: at.text_input[1].set_value("Calle de Alcalá, 10").run())
+        self.paso('agregar', lambda: at.file_uploader[1].set_value(
+            (f"menu_{self.numero}.pdf", pdf_minimo(f"Menu {self.numero}"), "application/pdf")).run())
+        self.paso('agregar', lambda: self.boton(etiqueta="Agregar Restaurante").click().run())
+
+    def valorar(self):
+        self.ir_a('valorar', "Valoraciones")
+        puntuacion = int(self.rng.integers(1, 6))
+        self.paso('valorar', lambda: self.at.slider(key="val_general").set_value(puntuacion).run())
+        self.paso('valorar', lambda: self.boton(etiqueta="📤 Enviar valoraciones").click().run())
+
+    def ejecutar(self, iteraciones, altas):
+        self.paso('inicio', self.at.run)
+        for iteracion in range(iteraciones):
+            self.buscar()
+            self.reservar()
+            self.mis_reservas()
+            self.valorar()
+            if altas and iteracion == 0:
+                self.agregar()
+        return self
+
+def _percentil(valores, q):
+    return round(float(np.percentile(valores, q)) * 1000, 2) if len(valores) else 0.0
+
+def _rss_mb():
+    # ru_maxrss viene en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def ejecutar_escenario(restaurantes, sesiones, iteraciones, altas):
+    # Se ejecuta en un proceso nuevo por escenario: cachés y RSS no se mezclan
+    directorio = os.environ["LA_CUCHARA_DATOS"]
+    preparar_catalogo(directorio, restaurantes)
+    sys.path.insert(0, RAIZ)
+
+    # Primera ejecución: carga del catálogo e índices (se informa aparte)
+    inicio = time.perf_counter()
+    calentamiento = Sesion(-1, 0)
+    calentamiento.paso('inicio', calentamiento.at.run)
+    arranque = time.perf_counter() - inicio
+    rss_inicial = _rss_mb()
+
+    with ThreadPoolExecutor(max_workers=sesiones) as pool:
+        resultados = list(pool.map(lambda i: Sesion(i, i + 1).ejecutar(iteraciones, altas), range(sesiones)))
+    rss_pico = _rss_mb()
+
+    medidas = [medida for sesion in resultados for medida in sesion.medidas]
+    segundos = [s for _, s, _, _ in medidas]
+    esperas = [e for _, _, e, _ in medidas]
+    payloads = [b for _, _, _, b in medidas]
+    por_flujo = {}
+    for flujo, s, _, _ in medidas:
+        por_flujo.setdefault(flujo, []).append(s)
+    return {
+        'restaurantes': restaurantes,
+        'platos': restaurantes * PLATOS_POR_RESTAURANTE,
+        'sesiones': sesiones,
+        'reruns': len(medidas),
+        'arranque_s': round(arranque, 2),
+        'p50_ms': _percentil(segundos, 50),
+        'p95_ms': _percentil(segundos, 95),
+        'p99_ms': _percentil(segundos, 99),
+        'espera_p95_ms': _percentil(esperas, 95),
+        'p95_ms_por_flujo': {flujo: _percentil(valores, 95) for flujo, valores in sorted(por_flujo.items())},
+        'payload_medio_bytes': int(np.mean(payloads)) if payloads else 0,
+        'payload_max_bytes': int(max(payloads, default=0)),
+        'rss_pico_mb': round(rss_pico, 1),
+        'rss_por_sesion_mb': round(max(rss_pico - rss_inicial, 0) / sesiones, 2),
+        'errores': [error for sesion in resultados for error in sesion.errores][:20],
+    }
+
+def lanzar_escenario(restaurantes, sesiones, iteraciones, altas):
+    with tempfile.TemporaryDirectory() as directorio:
+        entorno = {**os.environ, "LA_CUCHARA_DATOS": directorio, "LA_CUCHARA_MENUS": os.path.join(directorio, "menus")}
+        orden = [sys.executable, __file__, "--escenario", str(restaurantes), "--sesiones", str(sesiones),
+                 "--iteraciones", str(iteraciones)] + ([] if altas else ["--sin-altas"])
+        proceso = subprocess.run(orden, env=entorno, capture_output=True, text=True, cwd=RAIZ)
+    if proceso.returncode != 0:
+        raise RuntimeError(f"El escenario de {restaurantes} restaurantes falló:\n{proceso.stderr[-2000:]}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+# -----------------------------
+# Pintado de tarjetas según el número de platos
+# -----------------------------
+TAMANO_PAGINA_PINTADO = 10
+
+def importar_app(directorio):
+    # app.py es un script de Streamlit: al importarlo fuera del servidor se ejecuta una vez
+    # en modo "bare" (sin sesión) y deja accesibles sus clases y funciones
+    os.environ["LA_CUCHARA_DATOS"] = directorio
+    os.environ["LA_CUCHARA_MENUS"] = os.path.join(directorio, "menus")
+    from streamlit import config, logger
+    config.get_config_options()  # al leer la configuración se fija el nivel de log; después se baja
+    logger.set_log_level("error")  # sin avisos de "missing ScriptRunContext"
+    sys.path.insert(0, RAIZ)
+    import app
+    return app
+
+class EscaneoDataFrames:
+    # Búsquedas anteriores a las tablas de consulta: un filtro sobre todo el DataFrame
+    # por cada fila pintada
+    def __init__(self, restaurantes, platos):
+        self.restaurantes_df = restaurantes
+        self.platos_df = platos
+
+    def restaurante(self, restaurante_id):
+        return self.restaurantes_df[self.restaurantes_df['id'] == restaurante_id].iloc[0]
+
+    def platos(self, restaurante_id):
+        return self.platos_df[self.platos_df['restaurante_id'] == restaurante_id]
+
+def medir_pintado(tamanos, repeticiones=20):
+    # Misma página de tarjetas (html_tarjeta_restaurante) con las dos formas de buscar
+    from catalogo import platos_sinteticos, restaurantes_sinteticos, tipar
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        app = importar_app(directorio)
+        for platos_totales in tamanos:
+            num_restaurantes = max(platos_totales // PLATOS_POR_RESTAURANTE, 1)
+            restaurantes = tipar(restaurantes_sinteticos(num_restaurantes), 'restaurantes')
+            platos = tipar(platos_sinteticos(num_restaurantes, PLATOS_POR_RESTAURANTE), 'platos')
+            inicio = time.perf_counter()
+            tablas = app.TablasCatalogo(restaurantes, platos)
+            construccion = time.perf_counter() - inicio
+            ids = np.random.default_rng(0).choice(restaurantes['id'].to_numpy(), TAMANO_PAGINA_PINTADO)
+            tiempos = {}
+            for nombre, consulta in [('tablas', tablas), ('escaneo', EscaneoDataFrames(restaurantes, tablas.platos_ordenados))]:
+                app.catalogo = consulta  # html_tarjeta_restaurante usa el global del módulo
+                segundos = []
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    for restaurante_id in ids:
+                        app.html_tarjeta_restaurante(consulta.restaurante(restaurante_id))
+                    segundos.append(time.perf_counter() - inicio)
+                tiempos[nombre] = _percentil(segundos, 50)
+            resultados.append({'platos': len(platos), 'construccion_s': round(construccion, 3),
+                               'pagina_tablas_ms': tiempos['tablas'], 'pagina_escaneo_ms': tiempos['escaneo']})
+    return resultados
+
+def informe_pintado(resultados):
+    lineas = [f"Página de {TAMANO_PAGINA_PINTADO} tarjetas (mediana)",
+              f"{'platos':>10} {'tablas: construcción s':>22} {'página ms':>10} {'escaneo: página ms':>19}"]
+    for r in resultados:
+        lineas.append(f"{r['platos']:>10} {r['construccion_s']:>22} {r['pagina_tablas_ms']:>10} {r['pagina_escaneo_ms']:>19}")
+    return "\n".join(lineas)
+
+# -----------------------------
+# Escritura concurrente de reservas
+# -----------------------------
+def _escribir_reservas(repositorio, propietario, escrituras, semilla):
+    # Cada hilo es un propietario: crea reservas y modifica o cancela algunas de las suyas
+    rng = np.random.default_rng(semilla)
+    creadas, canceladas, latencias = [], set(), []
+    for i in range(escrituras):
+        inicio = time.perf_counter()
+        if creadas and i % 4 == 3:
+            reserva_id = creadas[int(rng.integers(len(creadas)))]
+            if repositorio.cancelar(reserva_id, propietario):
+                canceladas.add(reserva_id)
+        elif creadas and i % 4 == 2:
+            repositorio.modificar(creadas[-1], propietario, date.today() + timedelta(days=2), "21:00",
+                                  int(rng.integers(1, 8)))
+        else:
+            creadas.append(repositorio.crear({
+                'restaurante_id': int(rng.integers(1, 6)), 'fecha': date.today() + timedelta(days=1),
+                'hora': "14:00", 'num_personas': int(rng.integers(1, 8)), 'platos': [],
+                'estado': 'Confirmada', 'propietario': propietario}))
+        latencias.append(time.perf_counter() - inicio)
+    return propietario, creadas, canceladas, latencias
+
+def medir_escrituras(hilos, escrituras):
+    with tempfile.TemporaryDirectory() as directorio:
+        app = importar_app(directorio)
+        repositorio = app.obtener_repositorio_reservas()
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            por_hilo = list(pool.map(lambda i: _escribir_reservas(repositorio, f"carga-{i}", escrituras, i), range(hilos)))
+        segundos = time.perf_counter() - inicio
+
+        errores = []
+        ids = [reserva_id for _, creadas, _, _ in por_hilo for reserva_id in creadas]
+        if len(set(ids)) != len(ids):
+            errores.append(f"ids repetidos: {len(ids) - len(set(ids))}")
+        for propietario, creadas, canceladas, _ in por_hilo:
+            activas = set(repositorio.listar(propietario)['id'].tolist())
+            if activas != set(creadas) - canceladas:
+                errores.append(f"{propietario}: {len(activas)} reservas activas, se esperaban {len(set(creadas) - canceladas)}")
+        # Un propietario no puede cancelar ni modificar reservas de otro
+        ajena = por_hilo[0][1][0]
+        if repositorio.cancelar(ajena, "intruso") or repositorio.modificar(ajena, "intruso", date.today(), "14:00", 1):
+            errores.append(f"la reserva {ajena} se ha cambiado desde otro propietario")
+        latencias = [s for _, _, _, valores in por_hilo for s in valores]
+        return {
+            'hilos': hilos,
+            'escrituras': len(latencias),
+            'escrituras_por_s': round(len(latencias) / segundos, 1),
+            'p50_ms': _percentil(latencias, 50),
+            'p99_ms': _percentil(latencias, 99),
+            'errores': errores,
+        }
+
+def informe_escrituras(r):
+    lineas = [f"{r['escrituras']} escrituras de reservas con {r['hilos']} hilos: {r['escrituras_por_s']} por segundo, "
+              f"p50 {r['p50_ms']} ms, p99 {r['p99_ms']} ms"]
+    lineas += [f"error: {error}" for error in r['errores']]
+    return "\n".join(lineas)
+
+# -----------------------------
+# Informe y línea base
+# -----------------------------
+def clave_escenario(resultado):
+    return f"{resultado['restaurantes']}x{resultado['sesiones']}"
+
+def comparar(resultado, base, tolerancia):
+    referencia = base.get(clave_escenario(resultado))
+    if referencia is None:
+        return []
+    regresiones = []
+    for metrica in METRICAS_BASE:
+        limite = referencia[metrica] * (1 + tolerancia)
+        if resultado[metrica] > limite:
+            regresiones.append(f"{clave_escenario(resultado)} {metrica}: {resultado[metrica]} > {limite:.2f} "
+                               f"(base {referencia[metrica]})")
+    return regresiones
+
+def informe(resultados):
+    lineas = ["Latencia por rerun con los reruns en serie (AppTest no admite reruns simultáneos): "
+              "no son percentiles de peticiones concurrentes",
+              f"{'escenario':>12} {'reruns':>6} {'arranque s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'espera p95':>10} {'payload máx':>11} {'RSS pico MB':>11} {'MB/sesión':>9}"]
+    for r in resultados:
+        lineas.append(f"{clave_escenario(r):>12} {r['reruns']:>6} {r['arranque_s']:>10} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+                      f"{r['p99_ms']:>8} {r['espera_p95_ms']:>10} {r['payload_max_bytes']:>11} {r['rss_pico_mb']:>11} "
+                      f"{r['rss_por_sesion_mb']:>9}")
+        lineas.append("             p95 por flujo: " + ", ".join(f"{f} {v} ms" for f, v in r['p95_ms_por_flujo'].items()))
+        for error in r['errores']:
+            lineas.append(f"             error: {error}")
+    return "\n".join(lineas)
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Pruebas de carga de app.py con AppTest")
+    parser.add_argument('--restaurantes', type=int, nargs='+', default=[1000])
+    parser.add_argument('--sesiones', type=int, default=4)
+    parser.add_argument('--iteraciones', type=int, default=2)
+    parser.add_argument('--sin-altas', action='store_true', help="no da de alta restaurantes (no invalida índices)")
+    parser.add_argument('--base', default=RUTA_BASE)
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="empeoramiento admitido sobre la base (0.25 = 25%%)")
+    parser.add_argument('--guardar-base', action='store_true')
+    parser.add_argument('--maquina', default=MAQUINA, help="entrada de la línea base (por defecto, esta máquina)")
+    parser.add_argument('--salida', default=RUTA_SALIDA)
+    parser.add_argument('--pintado', action='store_true', help="mide el pintado de tarjetas según el número de platos")
+    parser.add_argument('--platos', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--reservas', action='store_true', help="mide la escritura concurrente de reservas en SQLite")
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--escrituras', type=int, default=200, help="escrituras por hilo")
+    parser.add_argument('--min-escrituras', type=float, default=200, help="escrituras por segundo exigidas")
+    parser.add_argument('--escenario', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argumentos)
+
+    if args.reservas:
+        resultado = medir_escrituras(args.hilos, args.escrituras)
+        texto = informe_escrituras(resultado)
+        print(texto)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n" + json.dumps(resultado, indent=2, ensure_ascii=False) + "\n")
+        return 1 if resultado['errores'] or resultado['escrituras_por_s'] < args.min_escrituras else 0
+
+    if args.pintado:
+        resultados = medir_pintado(args.platos)
+        texto = informe_pintado(resultados)
+        print(texto)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n" + json.dumps(resultados, indent=2) + "\n")
+        return 0
+
+    if args.escenario is not None:
+        print(json.dumps(ejecutar_escenario(args.escenario, args.sesiones, args.iteraciones, not args.sin_altas)))
+        return 0
+
+    resultados = [lanzar_escenario(n, args.sesiones, args.iteraciones, not args.sin_altas) for n in args.restaurantes]
+    texto = informe(resultados)
+    print(texto)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        f.write(texto + "\n" + json.dumps(resultados, indent=2, ensure_ascii=False) + "\n")
+
+    bases = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f:
+            bases = json.load(f)
+    base = bases.setdefault(args.maquina, {})
+    if args.guardar_base:
+        base.update({clave_escenario(r): {m: r[m] for m in METRICAS_BASE} for r in resultados})
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(bases, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Línea base de {args.maquina} guardada en {args.base}")
+        return 0
+    if not base:
+        print(f"Sin línea base para {args.maquina}: ejecuta con --guardar-base para crearla")
+    regresiones = [r for resultado in resultados for r in comparar(resultado, base, args.tolerancia)]
+    errores = [e for resultado in resultados for e in resultado['errores']]
+    for regresion in regresiones:
+        print(f"REGRESIÓN {regresion}")
+    return 1 if regresiones or errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,578 @@
+# Almacén columnar del catálogo (restaurantes y platos) en formato Arrow IPC.
+#
+# Importación masiva por bloques desde CSV, JSONL o Parquet con validación fila a fila,
+# exportación y carga con memoria mapeada desde la app. Las altas sueltas de la app van a
+# un registro de altas (restaurantes.altas.jsonl) que se une al cargar y se compacta en el
+# .arrow al importar o con `compactar`. Uso:
+#
+#     python catalogo.py importar restaurantes socios.csv
+#     python catalogo.py importar platos platos.jsonl
+#     python catalogo.py exportar restaurantes catalogo.parquet
+#     python catalogo.py compactar restaurantes
+#     python catalogo.py benchmark --filas 100000
+#     python catalogo.py memoria --filas 100000
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# LA_CUCHARA_DATOS permite apuntar la app y la CLI a otro directorio (p. ej. en benchmark.py)
+DIRECTORIO_DATOS = os.environ.get("LA_CUCHARA_DATOS") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DIRECTORIO_CATALOGO = os.path.join(DIRECTORIO_DATOS, "catalogo")
+TAMANO_BLOQUE = 50000
+
+TIPOS_COCINA = ["Mediterráneo", "Asiático", "Italiano", "Español", "Vegetariano", "Otro"]
+TIPOS_PLATO = ["Entrante", "Principal", "Postre"]
+
+# Tipos compactos: booleanos empaquetados en bits, tipo como diccionario int8 y precios int16
+ESQUEMAS = {
+    'restaurantes': pa.schema([
+        ('id', pa.int32()),
+        ('nombre', pa.string()),
+        ('valoracion', pa.float32()),
+        ('ubicacion', pa.string()),
+        ('tipo', pa.dictionary(pa.int8(), pa.string())),
+        ('precio_min', pa.int16()),
+        ('precio_max', pa.int16()),
+        ('promocionado', pa.bool_()),
+        ('menu_diario', pa.bool_()),
+        ('menu_celiaco', pa.bool_()),
+        ('menu_vegetariano', pa.bool_()),
+        ('menu_vegano', pa.bool_()),
+        ('descripcion', pa.string()),
+        ('lat', pa.float32()),
+        ('lon', pa.float32()),
+    ]),
+    'platos': pa.schema([
+        ('id', pa.int32()),
+        ('restaurante_id', pa.int32()),
+        ('nombre', pa.string()),
+        ('tipo', pa.dictionary(pa.int8(), pa.string())),
+        ('valoracion', pa.float32()),
+        ('precio', pa.int16()),
+        ('en_menu_hoy', pa.bool_()),
+        ('promocionado', pa.bool_()),
+        ('celiaco', pa.bool_()),
+        ('vegetariano', pa.bool_()),
+        ('vegano', pa.bool_()),
+    ]),
+}
+CATEGORIAS = {'restaurantes': TIPOS_COCINA, 'platos': TIPOS_PLATO}
+OPCIONALES = {'descripcion': "", 'lat': np.nan, 'lon': np.nan}
+
+# -----------------------------
+# Modelo de datos en memoria
+# -----------------------------
+ESTADOS_RESERVA = ["Pendiente", "Confirmada", "Cancelada"]
+
+def _dtype(tabla, campo):
+    if pa.types.is_dictionary(campo.type):
+        return pd.CategoricalDtype(CATEGORIAS[tabla])
+    if pa.types.is_string(campo.type):
+        return 'str'
+    return np.dtype(campo.type.to_pandas_dtype())
+
+# dtypes de pandas por tabla: el catálogo los toma de ESQUEMAS; las reservas guardan
+# los platos como lista de ids int32 (Arrow) en lugar de texto separado por comas
+TIPOS_COLUMNAS = {tabla: {campo.name: _dtype(tabla, campo) for campo in esquema} for tabla, esquema in ESQUEMAS.items()}
+TIPOS_COLUMNAS['reservas'] = {
+    'id': np.dtype('int32'),
+    'restaurante_id': np.dtype('int32'),
+    'fecha': np.dtype('datetime64[s]'),
+    'hora': 'str',
+    'num_personas': np.dtype('uint8'),
+    'platos': pd.ArrowDtype(pa.list_(pa.int32())),
+    'estado': pd.CategoricalDtype(ESTADOS_RESERVA),
+    'comentario': 'str',
+    'propietario': 'str',
+    'revision': np.dtype('int32'),
+}
+
+def tipar(datos, tabla):
+    # Convierte las columnas presentes a los dtypes compactos del modelo
+    tipos = TIPOS_COLUMNAS[tabla]
+    return datos.astype({columna: tipos[columna] for columna in datos.columns if columna in tipos})
+
+def bytes_por_fila(datos):
+    return float(datos.memory_usage(deep=True, index=False).sum()) / max(len(datos), 1)
+
+def sin_tipar(datos):
+    # Representación anterior: columnas object y listas de platos como texto separado por comas
+    anterior = datos.astype(object)
+    for columna, dtype in datos.dtypes.items():
+        if isinstance(dtype, pd.ArrowDtype) and pa.types.is_list(dtype.pyarrow_dtype):
+            anterior[columna] = [", ".join(map(str, valor)) for valor in datos[columna]]
+    return anterior
+
+def informe_memoria(tablas):
+    filas = []
+    for nombre, datos in tablas.items():
+        antes, despues = bytes_por_fila(sin_tipar(datos)), bytes_por_fila(datos)
+        filas.append({'tabla': nombre, 'filas': len(datos),
+                      'bytes/fila antes': round(antes, 1), 'bytes/fila ahora': round(despues, 1),
+                      'reducción': f"{antes / despues:.1f}x" if despues else "-"})
+    return pd.DataFrame(filas)
+
+# -----------------------------
+# Texto y geocodificación
+# -----------------------------
+def normalizar_texto(texto):
+    # Minúsculas y sin tildes: "Gran Vía" -> "gran via"
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+def tokenizar(texto):
+    return [t for t in ''.join(c if c.isalnum() else ' ' for c in normalizar_texto(texto)).split() if t]
+
+# Nomenclátor local de Madrid (calles y barrios) para geocodificar sin red.
+# Coordenadas aproximadas (lat, lon) del punto central de cada vía o barrio.
+NOMENCLATOR_MADRID = {
+    # Calles, plazas y avenidas
+    "gran via": (40.4200, -3.7058),
+    "serrano": (40.4296, -3.6871),
+    "plaza mayor": (40.4155, -3.7074),
+    "avenida de la constitucion": (40.3990, -3.7150),
+    "velazquez": (40.4280, -3.6836),
+    "alcala": (40.4240, -3.6880),
+    "puerta del sol": (40.4169, -3.7035),
+    "calle mayor": (40.4153, -3.7100),
+    "atocha": (40.4110, -3.6990),
+    "castellana": (40.4450, -3.6910),
+    "fuencarral": (40.4270, -3.7020),
+    "goya": (40.4250, -3.6780),
+    "princesa": (40.4290, -3.7150),
+    "arenal": (40.4175, -3.7080),
+    "paseo del prado": (40.4125, -3.6930),
+    "bravo murillo": (40.4530, -3.7040),
+    "hortaleza": (40.4230, -3.6990),
+    "alberto aguilera": (40.4300, -3.7110),
+    "ortega y gasset": (40.4300, -3.6830),
+    "plaza de espana": (40.4233, -3.7122),
+    # Barrios
+    "sol": (40.4169, -3.7035),
+    "centro": (40.4168, -3.7038),
+    "malasana": (40.4260, -3.7050),
+    "chueca": (40.4230, -3.6970),
+    "lavapies": (40.4090, -3.7010),
+    "la latina": (40.4110, -3.7100),
+    "huertas": (40.4140, -3.6990),
+    "embajadores": (40.4080, -3.7030),
+    "palacio": (40.4150, -3.7130),
+    "justicia": (40.4240, -3.6960),
+    "recoletos": (40.4230, -3.6890),
+    "salamanca": (40.4300, -3.6800),
+    "chamberi": (40.4340, -3.7040),
+    "retiro": (40.4110, -3.6770),
+    "arguelles": (40.4300, -3.7170),
+    "moncloa": (40.4350, -3.7190),
+    "tetuan": (40.4600, -3.6980),
+    "chamartin": (40.4600, -3.6770),
+    "arganzuela": (40.4000, -3.6980),
+}
+# Se prueban primero los nombres más largos ("plaza mayor" antes que "calle mayor" o "sol")
+_NOMBRES_NOMENCLATOR = sorted(NOMENCLATOR_MADRID, key=len, reverse=True)
+
+def geocodificar(texto):
+    # Devuelve (lat, lon) de la primera calle o barrio conocido que aparezca en el texto
+    normalizado = " " + " ".join(tokenizar(texto)) + " "
+    for nombre in _NOMBRES_NOMENCLATOR:
+        if f" {nombre} " in normalizado:
+            return NOMENCLATOR_MADRID[nombre]
+    return (np.nan, np.nan)
+
+# -----------------------------
+# Validación
+# -----------------------------
+_VERDADEROS = {'true', '1', 'si', 'sí', 'yes', 't', 'y'}
+_FALSOS = {'false', '0', 'no', 'f', 'n', ''}
+
+def _booleanos(serie):
+    # Devuelve (valores, válidos) admitiendo bool nativo o texto tipo "true"/"0"/"sí"
+    if serie.dtype == bool:
+        return serie.to_numpy(), np.ones(len(serie), dtype=bool)
+    texto = serie.fillna('').astype(str).str.strip().str.lower()
+    return texto.isin(_VERDADEROS).to_numpy(), (texto.isin(_VERDADEROS) | texto.isin(_FALSOS)).to_numpy()
+
+def _enteros(serie, minimo, maximo):
+    numeros = pd.to_numeric(serie, errors='coerce')
+    validos = numeros.notna() & (numeros == np.floor(numeros)) & (numeros >= minimo) & (numeros <= maximo)
+    return numeros.fillna(0).to_numpy(), validos.to_numpy()
+
+def validar_bloque(tabla, bloque, ids_vistos, ids_restaurantes=None):
+    # Valida un bloque de filas; devuelve el DataFrame limpio (solo filas válidas) y la
+    # lista de errores (posición en el bloque, motivo). Acumula los ids en ids_vistos.
+    esquema = ESQUEMAS[tabla]
+    errores = []
+    invalidas = np.zeros(len(bloque), dtype=bool)
+    limpio = {}
+
+    def marcar(mascara, motivo):
+        for posicion in np.flatnonzero(mascara & ~invalidas):
+            errores.append((int(posicion), motivo))
+        invalidas[mascara] = True
+
+    for campo in esquema:
+        if campo.name not in bloque.columns:
+            if campo.name in OPCIONALES:
+                bloque = bloque.assign(**{campo.name: OPCIONALES[campo.name]})
+            else:
+                return bloque.iloc[0:0], [(i, f"falta la columna '{campo.name}'") for i in range(len(bloque))]
+
+    for campo in esquema:
+        serie = bloque[campo.name]
+        if campo.name == 'id' or campo.name == 'restaurante_id':
+            valores, validos = _enteros(serie, 1, 2 ** 31 - 1)
+            marcar(~validos, f"{campo.name} no es un entero positivo")
+            limpio[campo.name] = valores.astype(np.int32)
+        elif pa.types.is_boolean(campo.type):
+            valores, validos = _booleanos(serie)
+            marcar(~validos, f"{campo.name} no es un booleano")
+            limpio[campo.name] = valores
+        elif pa.types.is_int16(campo.type):
+            valores, validos = _enteros(serie, 0, 1000)
+            marcar(~validos, f"{campo.name} debe ser un entero entre 0 y 1000")
+            limpio[campo.name] = valores.astype(np.int16)
+        elif campo.name == 'valoracion':
+            valores = pd.to_numeric(serie, errors='coerce')
+            marcar(~(valores.between(0, 5)).to_numpy(), "valoracion debe estar entre 0 y 5")
+            limpio[campo.name] = valores.fillna(0).to_numpy(dtype=np.float32)
+        elif pa.types.is_dictionary(campo.type):
+            texto = serie.astype(str).str.strip()
+            marcar(~texto.isin(CATEGORIAS[tabla]).to_numpy(), f"tipo desconocido (admitidos: {', '.join(CATEGORIAS[tabla])})")
+            limpio[campo.name] = texto.to_numpy()
+        elif campo.name in ('lat', 'lon'):
+            limpio[campo.name] = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=np.float32)
+        else:
+            texto = serie.fillna('').astype(str).str.strip()
+            if campo.name not in OPCIONALES:
+                marcar((texto == '').to_numpy(), f"{campo.name} vacío")
+            limpio[campo.name] = texto.to_numpy()
+
+    limpio = pd.DataFrame(limpio)
+    if tabla == 'restaurantes':
+        marcar((limpio['precio_min'] > limpio['precio_max']).to_numpy(), "precio_min mayor que precio_max")
+        # Coordenadas del nomenclátor cuando el socio no las envía
+        sin_coordenadas = np.isnan(limpio['lat'].to_numpy()) | np.isnan(limpio['lon'].to_numpy())
+        if sin_coordenadas.any():
+            coordenadas = np.array([geocodificar(u) for u in limpio.loc[sin_coordenadas, 'ubicacion']], dtype=np.float32)
+            limpio.loc[sin_coordenadas, 'lat'] = coordenadas[:, 0]
+            limpio.loc[sin_coordenadas, 'lon'] = coordenadas[:, 1]
+    if ids_restaurantes is not None:
+        marcar(~np.isin(limpio['restaurante_id'].to_numpy(), ids_restaurantes), "restaurante_id no existe")
+
+    ids = limpio['id'].to_numpy()
+    repetidos = pd.Series(ids).duplicated().to_numpy() | np.isin(ids, np.fromiter(ids_vistos, dtype=np.int64, count=len(ids_vistos)))
+    marcar(repetidos & ~invalidas, "id duplicado")
+    limpio = limpio[~invalidas]
+    ids_vistos.update(limpio['id'].tolist())
+    return limpio, sorted(errores)
+
+def a_lote(tabla, limpio):
+    # DataFrame validado -> RecordBatch con el esquema compacto
+    esquema = ESQUEMAS[tabla]
+    columnas = []
+    for campo in esquema:
+        if pa.types.is_dictionary(campo.type):
+            categorias = CATEGORIAS[tabla]
+            indices = pd.Categorical(limpio[campo.name], categories=categorias).codes.astype(np.int8)
+            columnas.append(pa.DictionaryArray.from_arrays(indices, pa.array(categorias, type=pa.string())))
+        else:
+            columnas.append(pa.array(limpio[campo.name].to_numpy(), type=campo.type))
+    return pa.RecordBatch.from_arrays(columnas, schema=esquema)
+
+# -----------------------------
+# Lectura por bloques, importación y exportación
+# -----------------------------
+def leer_bloques(ruta, tamano_bloque=TAMANO_BLOQUE):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(ruta, chunksize=tamano_bloque, dtype=str, keep_default_na=False)
+    elif extension in ('.jsonl', '.ndjson'):
+        yield from pd.read_json(ruta, lines=True, chunksize=tamano_bloque, dtype=False)
+    elif extension == '.parquet':
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tamano_bloque):
+            yield lote.to_pandas()
+    else:
+        raise ValueError(f"Formato no soportado: {extension} (usa .csv, .jsonl o .parquet)")
+
+def ruta_tabla(tabla, directorio=DIRECTORIO_CATALOGO):
+    return os.path.join(directorio, f"{tabla}.arrow")
+
+def existe_tabla(tabla, directorio=DIRECTORIO_CATALOGO):
+    return os.path.exists(ruta_tabla(tabla, directorio))
+
+def _abrir(tabla, directorio):
+    return pa.ipc.open_file(pa.memory_map(ruta_tabla(tabla, directorio), 'r'))
+
+def _ids_restaurantes(tabla, directorio):
+    # Ids contra los que se comprueba restaurante_id al importar platos
+    if tabla != 'platos':
+        return None
+    return cargar_tabla('restaurantes', directorio, columnas=['id'])['id'].to_numpy() \
+        if existe_tabla('restaurantes', directorio) else np.empty(0, dtype=np.int32)
+
+def ruta_altas(tabla, directorio=DIRECTORIO_CATALOGO):
+    return os.path.join(directorio, f"{tabla}.altas.jsonl")
+
+def contar_altas(tabla, directorio=DIRECTORIO_CATALOGO):
+    if not os.path.exists(ruta_altas(tabla, directorio)):
+        return 0
+    with open(ruta_altas(tabla, directorio), encoding='utf-8') as entrada:
+        return sum(1 for _ in entrada)
+
+def anexar_altas(tabla, filas, directorio=DIRECTORIO_CATALOGO):
+    # Altas sueltas sin reescribir el .arrow: se validan como en la importación y se añaden
+    # al final del registro de altas, así cada alta cuesta O(filas nuevas) y no O(catálogo)
+    os.makedirs(directorio, exist_ok=True)
+    limpio, errores = validar_bloque(tabla, filas.reset_index(drop=True), set(), _ids_restaurantes(tabla, directorio))
+    if len(limpio):
+        for columna in limpio.select_dtypes(include='float32'):
+            limpio[columna] = limpio[columna].astype(float).round(6)
+        with open(ruta_altas(tabla, directorio), 'a+', encoding='utf-8') as salida:
+            # Una línea a medio escribir por una caída anterior no se mezcla con la nueva
+            if salida.tell() > 0:
+                salida.seek(salida.tell() - 1)
+                if salida.read(1) != '\n':
+                    salida.write('\n')
+            salida.write(limpio.to_json(orient='records', lines=True, force_ascii=False))
+            salida.flush()
+            os.fsync(salida.fileno())
+    return len(limpio), errores
+
+def _lote_altas(tabla, directorio, ids_almacen):
+    # Registro de altas como RecordBatch, sin las filas que ya están en el .arrow (una
+    # compactación interrumpida entre el renombrado y el borrado del registro) ni las
+    # líneas que no se llegaron a escribir enteras
+    if not os.path.exists(ruta_altas(tabla, directorio)):
+        return None
+    filas = []
+    with open(ruta_altas(tabla, directorio), encoding='utf-8') as entrada:
+        for linea in entrada:
+            try:
+                filas.append(json.loads(linea))
+            except json.JSONDecodeError:
+                continue
+    if not filas:
+        return None
+    altas = pd.DataFrame(filas)
+    altas = altas[~np.isin(pd.to_numeric(altas['id'], errors='coerce'), ids_almacen)]
+    limpio, _ = validar_bloque(tabla, altas.reset_index(drop=True), set(), _ids_restaurantes(tabla, directorio))
+    return a_lote(tabla, limpio) if len(limpio) else None
+
+def importar_bloques(tabla, bloques, directorio=DIRECTORIO_CATALOGO, anexar=True):
+    # Escribe en un fichero temporal (primero las filas existentes y el registro de altas
+    # si se anexa) y lo renombra al final, así la app nunca ve un almacén a medio escribir.
+    # El registro de altas queda vacío: al anexar sus filas ya están en el .arrow.
+    os.makedirs(directorio, exist_ok=True)
+    ids_vistos = set()
+    ids_restaurantes = _ids_restaurantes(tabla, directorio)
+    importadas, errores, fila_base = 0, [], 0
+    temporal = tempfile.NamedTemporaryFile(dir=directorio, suffix=".tmp", delete=False)
+    temporal.close()
+    try:
+        with pa.OSFile(temporal.name, 'wb') as destino, pa.ipc.new_file(destino, ESQUEMAS[tabla]) as escritor:
+            if anexar and existe_tabla(tabla, directorio):
+                lector = _abrir(tabla, directorio)
+                for i in range(lector.num_record_batches):
+                    lote = lector.get_batch(i)
+                    ids_vistos.update(lote.column('id').to_pylist())
+                    escritor.write_batch(lote)
+            if anexar:
+                altas = _lote_altas(tabla, directorio, np.fromiter(ids_vistos, dtype=np.int64, count=len(ids_vistos)))
+                if altas is not None:
+                    ids_vistos.update(altas.column('id').to_pylist())
+                    escritor.write_batch(altas)
+            for bloque in bloques:
+                limpio, errores_bloque = validar_bloque(tabla, bloque.reset_index(drop=True), ids_vistos, ids_restaurantes)
+                errores.extend((fila_base + posicion, motivo) for posicion, motivo in errores_bloque)
+                fila_base += len(bloque)
+                if len(limpio):
+                    escritor.write_batch(a_lote(tabla, limpio))
+                    importadas += len(limpio)
+        os.replace(temporal.name, ruta_tabla(tabla, directorio))
+        if os.path.exists(ruta_altas(tabla, directorio)):
+            os.remove(ruta_altas(tabla, directorio))
+    finally:
+        if os.path.exists(temporal.name):
+            os.remove(temporal.name)
+    return importadas, errores
+
+def importar(tabla, ruta, directorio=DIRECTORIO_CATALOGO, anexar=True, tamano_bloque=TAMANO_BLOQUE):
+    return importar_bloques(tabla, leer_bloques(ruta, tamano_bloque), directorio, anexar)
+
+def compactar(tabla, directorio=DIRECTORIO_CATALOGO):
+    # Pasa el registro de altas al .arrow; devuelve cuántas altas había pendientes
+    pendientes = contar_altas(tabla, directorio)
+    if pendientes:
+        importar_bloques(tabla, [], directorio, anexar=True)
+    return pendientes
+
+def _lotes(tabla, directorio):
+    lector = _abrir(tabla, directorio)
+    lotes = [lector.get_batch(i) for i in range(lector.num_record_batches)]
+    ids = np.concatenate([lote.column('id').to_numpy() for lote in lotes]) if lotes else np.empty(0, dtype=np.int32)
+    altas = _lote_altas(tabla, directorio, ids)
+    return lotes + [altas] if altas is not None else lotes
+
+def exportar(tabla, ruta, directorio=DIRECTORIO_CATALOGO):
+    extension = os.path.splitext(ruta)[1].lower()
+    lotes = _lotes(tabla, directorio)
+    if extension == '.parquet':
+        with pq.ParquetWriter(ruta, ESQUEMAS[tabla]) as escritor:
+            for lote in lotes:
+                escritor.write_batch(lote)
+        return
+    with open(ruta, 'w', encoding='utf-8', newline='') as salida:
+        for i, lote in enumerate(lotes):
+            bloque = lote.to_pandas()
+            # float32 -> decimal corto ("4.7" y no "4.699999809")
+            for columna in bloque.select_dtypes(include='float32'):
+                bloque[columna] = bloque[columna].astype(float).round(6)
+            if extension == '.csv':
+                bloque.to_csv(salida, header=(i == 0), index=False)
+            elif extension in ('.jsonl', '.ndjson'):
+                bloque.to_json(salida, orient='records', lines=True, force_ascii=False)
+                salida.write('\n')
+            else:
+                raise ValueError(f"Formato no soportado: {extension} (usa .csv, .jsonl o .parquet)")
+
+def cargar_tabla(tabla, directorio=DIRECTORIO_CATALOGO, columnas=None):
+    # Lectura con memoria mapeada más el registro de altas; tipo se convierte en pandas.Categorical
+    tabla_arrow = pa.Table.from_batches(_lotes(tabla, directorio), schema=ESQUEMAS[tabla])
+    if columnas is not None:
+        tabla_arrow = tabla_arrow.select(columnas)
+    return tipar(tabla_arrow.to_pandas(), tabla)
+
+def asegurar_tabla(tabla, datos_iniciales, directorio=DIRECTORIO_CATALOGO):
+    # Si el almacén aún no existe se crea con los datos de ejemplo
+    if not existe_tabla(tabla, directorio):
+        importadas, errores = importar_bloques(tabla, [datos_iniciales], directorio, anexar=False)
+        if errores:
+            raise ValueError(f"Datos iniciales de {tabla} no válidos: {errores[:5]}")
+
+# -----------------------------
+# Línea de comandos
+# -----------------------------
+def restaurantes_sinteticos(filas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    calles = list(NOMENCLATOR_MADRID)
+    precio_min = rng.integers(8, 30, filas)
+    return pd.DataFrame({
+        'id': np.arange(1, filas + 1),
+        'nombre': [f"Restaurante {i}" for i in range(1, filas + 1)],
+        'valoracion': np.round(rng.uniform(3, 5, filas), 1),
+        'ubicacion': [f"Calle {calles[i % len(calles)].title()}, {i % 200 + 1}" for i in range(filas)],
+        'tipo': rng.choice(TIPOS_COCINA, filas),
+        'precio_min': precio_min,
+        'precio_max': precio_min + rng.integers(0, 20, filas),
+        'promocionado': rng.random(filas) < 0.1,
+        'menu_diario': rng.random(filas) < 0.6,
+        'menu_celiaco': rng.random(filas) < 0.4,
+        'menu_vegetariano': rng.random(filas) < 0.5,
+        'menu_vegano': rng.random(filas) < 0.2,
+        'descripcion': "",
+    })
+
+def _benchmark(filas, tamano_bloque):
+    with tempfile.TemporaryDirectory() as directorio:
+        entrada = os.path.join(directorio, "restaurantes.csv")
+        restaurantes_sinteticos(filas).to_csv(entrada, index=False)
+        inicio = time.perf_counter()
+        importadas, errores = importar('restaurantes', entrada, directorio, anexar=False, tamano_bloque=tamano_bloque)
+        segundos = time.perf_counter() - inicio
+        tamano = os.path.getsize(ruta_tabla('restaurantes', directorio))
+        inicio = time.perf_counter()
+        cargar_tabla('restaurantes', directorio)
+        carga = time.perf_counter() - inicio
+    print(f"{importadas} filas importadas en {segundos:.2f} s ({importadas / segundos:,.0f} filas/s), "
+          f"{len(errores)} errores, {tamano / importadas:.1f} bytes/fila en disco, carga en {carga * 1000:.1f} ms")
+
+NOMBRES_PLATOS_SINTETICOS = ["Paella", "Gazpacho", "Croquetas", "Tortilla", "Pulpo", "Risotto", "Pizza", "Ramen",
+                             "Sushi", "Curry", "Ensalada", "Hamburguesa", "Tarta", "Flan", "Brownie", "Cochinillo"]
+
+def platos_sinteticos(num_restaurantes, por_restaurante=10, semilla=0):
+    rng = np.random.default_rng(semilla)
+    filas = num_restaurantes * por_restaurante
+    nombres = rng.choice(NOMBRES_PLATOS_SINTETICOS, filas)
+    return pd.DataFrame({
+        'id': np.arange(1, filas + 1),
+        'restaurante_id': np.repeat(np.arange(1, num_restaurantes + 1), por_restaurante),
+        'nombre': [f"{nombre} {i % 97}" for i, nombre in enumerate(nombres)],
+        'tipo': rng.choice(TIPOS_PLATO, filas),
+        'valoracion': np.round(rng.uniform(3, 5, filas), 1),
+        'precio': rng.integers(4, 35, filas),
+        'en_menu_hoy': rng.random(filas) < 0.7,
+        'promocionado': rng.random(filas) < 0.05,
+        'celiaco': rng.random(filas) < 0.3,
+        'vegetariano': rng.random(filas) < 0.3,
+        'vegano': rng.random(filas) < 0.1,
+    })
+
+def reservas_sinteticas(filas, num_restaurantes, semilla=0):
+    rng = np.random.default_rng(semilla)
+    fechas = np.datetime64('2025-01-01T13:00') + rng.integers(0, 90 * 96, filas) * np.timedelta64(15, 'm')
+    return pd.DataFrame({
+        'id': np.arange(1, filas + 1),
+        'restaurante_id': rng.integers(1, num_restaurantes + 1, filas),
+        'fecha': fechas,
+        'hora': pd.DatetimeIndex(fechas).strftime("%H:%M"),
+        'num_personas': rng.integers(1, 9, filas),
+        'platos': [rng.integers(1, 10 * num_restaurantes, n).tolist() for n in rng.integers(0, 5, filas)],
+        'estado': rng.choice(["Pendiente", "Confirmada"], filas),
+        'comentario': np.where(rng.random(filas) < 0.2, "Mesa en terraza", ""),
+    })
+
+def _memoria(filas):
+    restaurantes = tipar(restaurantes_sinteticos(filas), 'restaurantes')
+    reservas = tipar(reservas_sinteticas(filas * 3, filas), 'reservas')
+    print(informe_memoria({'restaurantes': restaurantes, 'reservas': reservas}).to_string(index=False))
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Importación y exportación masiva del catálogo")
+    sub = parser.add_subparsers(dest='orden', required=True)
+    importar_cmd = sub.add_parser('importar')
+    importar_cmd.add_argument('tabla', choices=sorted(ESQUEMAS))
+    importar_cmd.add_argument('ruta')
+    importar_cmd.add_argument('--reemplazar', action='store_true', help="sustituye la tabla en lugar de anexar")
+    importar_cmd.add_argument('--bloque', type=int, default=TAMANO_BLOQUE)
+    exportar_cmd = sub.add_parser('exportar')
+    exportar_cmd.add_argument('tabla', choices=sorted(ESQUEMAS))
+    exportar_cmd.add_argument('ruta')
+    compactar_cmd = sub.add_parser('compactar', help="pasa el registro de altas de la app al .arrow")
+    compactar_cmd.add_argument('tabla', choices=sorted(ESQUEMAS))
+    benchmark_cmd = sub.add_parser('benchmark')
+    benchmark_cmd.add_argument('--filas', type=int, default=100000)
+    benchmark_cmd.add_argument('--bloque', type=int, default=TAMANO_BLOQUE)
+    memoria_cmd = sub.add_parser('memoria', help="bytes por fila con y sin el modelo compacto")
+    memoria_cmd.add_argument('--filas', type=int, default=100000)
+    args = parser.parse_args(argumentos)
+
+    if args.orden == 'importar':
+        importadas, errores = importar(args.tabla, args.ruta, anexar=not args.reemplazar, tamano_bloque=args.bloque)
+        print(f"{importadas} filas importadas en {args.tabla}, {len(errores)} rechazadas")
+        for fila, motivo in errores[:20]:
+            print(f"  fila {fila + 1}: {motivo}")
+        return 1 if errores else 0
+    if args.orden == 'exportar':
+        exportar(args.tabla, args.ruta)
+        print(f"{args.tabla} exportada a {args.ruta}")
+        return 0
+    if args.orden == 'compactar':
+        print(f"{compactar(args.tabla)} altas compactadas en {args.tabla}")
+        return 0
+    if args.orden == 'memoria':
+        _memoria(args.filas)
+        return 0
+    _benchmark(args.filas, args.bloque)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# Calendario de plazas por restaurante en turnos de 15 minutos para la página de reservas.
+#
+# No depende de Streamlit: app.py mantiene un motor por día (obtener_motor_disponibilidad)
+# y los tests lo usan directamente.
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+MINUTOS_POR_TURNO = 15
+TURNOS_POR_DIA = 24 * 60 // MINUTOS_POR_TURNO
+DIAS_CALENDARIO = 90
+DURACION_RESERVA = 8  # turnos de 15 minutos (2 horas)
+CAPACIDAD_POR_DEFECTO = 40
+HORARIO_SERVICIO = [("13:00", "16:00"), ("20:00", "23:00")]  # horas de inicio admitidas
+HORA_POR_DEFECTO = "20:00"
+
+class MotorDisponibilidad:
+    # Calendario en memoria: matriz uint8 restaurantes x turnos de 15 minutos con las
+    # plazas ocupadas. Reservar, liberar y mover se hacen bajo un lock (comprobar y
+    # reservar es atómico) y solo tocan los turnos de la propia reserva.
+    def __init__(self, inicio, dias=DIAS_CALENDARIO):
+        self.lock = threading.Lock()
+        self.inicio = datetime.combine(inicio, datetime.min.time())
+        self.num_turnos = dias * TURNOS_POR_DIA
+        self.fila_por_id = {}
+        self.capacidad = np.zeros(0, dtype=np.uint8)
+        self.ocupacion = np.zeros((0, self.num_turnos), dtype=np.uint8)
+        apertura = np.zeros(TURNOS_POR_DIA, dtype=bool)
+        for desde, hasta in HORARIO_SERVICIO:
+            apertura[self._turno_del_dia(desde):self._turno_del_dia(hasta) + 1] = True
+        self.apertura = np.tile(apertura, dias)
+
+    def _turno_del_dia(self, hora):
+        horas, minutos = map(int, hora.split(":"))
+        return (horas * 60 + minutos) // MINUTOS_POR_TURNO
+
+    def _turno(self, fecha_hora):
+        minutos = (pd.Timestamp(fecha_hora) - self.inicio).total_seconds() // 60
+        turno = int(minutos // MINUTOS_POR_TURNO)
+        return turno if 0 <= turno <= self.num_turnos - DURACION_RESERVA else None
+
+    def _fila(self, restaurante_id):
+        fila = self.fila_por_id.get(restaurante_id)
+        if fila is None:
+            fila = self.fila_por_id[restaurante_id] = len(self.fila_por_id)
+            if fila >= len(self.ocupacion):
+                # Crecimiento geométrico para que añadir restaurantes sea O(1) amortizado
+                nuevas = max(16, len(self.ocupacion))
+                self.ocupacion = np.vstack([self.ocupacion, np.zeros((nuevas, self.num_turnos), dtype=np.uint8)])
+                self.capacidad = np.concatenate([self.capacidad, np.zeros(nuevas, dtype=np.uint8)])
+            self.capacidad[fila] = CAPACIDAD_POR_DEFECTO
+        return fila
+
+    def _cabe(self, fila, turno, personas):
+        tramo = self.ocupacion[fila, turno:turno + DURACION_RESERVA]
+        return bool(np.all(tramo.astype(np.int16) + personas <= self.capacidad[fila]))
+
+    def motivo_rechazo(self, fecha_hora):
+        # Por qué no se puede reservar a esa hora aunque haya sitio; None si está en
+        # el calendario y dentro del horario de servicio
+        turno = self._turno(fecha_hora)
+        if turno is None:
+            fin = self.inicio + timedelta(days=self.num_turnos // TURNOS_POR_DIA - 1)
+            return f"Solo se admiten reservas entre el {self.inicio.strftime('%d/%m/%Y')} y el {fin.strftime('%d/%m/%Y')}."
+        if not self.apertura[turno]:
+            tramos = " y de ".join(f"{desde} a {hasta}" for desde, hasta in HORARIO_SERVICIO)
+            return f"Solo se admiten reservas con hora de llegada de {tramos}."
+        return None
+
+    def reservar(self, restaurante_id, fecha_hora, personas, forzar=False):
+        # forzar: reconstrucción desde la base de datos, sin comprobar horario ni plazas
+        turno = self._turno(fecha_hora)
+        if turno is None or not (forzar or self.apertura[turno]):
+            return False
+        with self.lock:
+            fila = self._fila(restaurante_id)
+            if not forzar and not self._cabe(fila, turno, personas):
+                return False
+            tramo = self.ocupacion[fila, turno:turno + DURACION_RESERVA]
+            tramo[:] = np.minimum(tramo.astype(np.int16) + personas, 255)
+            return True
+
+    def liberar(self, restaurante_id, fecha_hora, personas):
+        turno = self._turno(fecha_hora)
+        if turno is None:
+            return
+        with self.lock:
+            fila = self._fila(restaurante_id)
+            tramo = self.ocupacion[fila, turno:turno + DURACION_RESERVA]
+            tramo[:] = np.maximum(tramo.astype(np.int16) - personas, 0)
+
+    def mover(self, restaurante_id, fecha_anterior, personas_anteriores, fecha_nueva, personas_nuevas):
+        # Libera la reserva anterior y ocupa la nueva; si no cabe, se deja como estaba
+        turno_nuevo = self._turno(fecha_nueva)
+        if turno_nuevo is None or not self.apertura[turno_nuevo]:
+            return False
+        with self.lock:
+            fila = self._fila(restaurante_id)
+            turno_anterior = self._turno(fecha_anterior)
+            if turno_anterior is not None:
+                anterior = self.ocupacion[fila, turno_anterior:turno_anterior + DURACION_RESERVA]
+                anterior[:] = np.maximum(anterior.astype(np.int16) - personas_anteriores, 0)
+            if not self._cabe(fila, turno_nuevo, personas_nuevas):
+                if turno_anterior is not None:
+                    anterior[:] = np.minimum(anterior.astype(np.int16) + personas_anteriores, 255)
+                return False
+            nuevo = self.ocupacion[fila, turno_nuevo:turno_nuevo + DURACION_RESERVA]
+            nuevo[:] = np.minimum(nuevo.astype(np.int16) + personas_nuevas, 255)
+            return True
+
+    def proximos_libres(self, restaurante_id, desde, personas, n=5):
+        # Primeros n turnos de inicio, dentro del horario, con sitio para `personas`
+        # durante toda la reserva. Ventanas deslizantes con sumas acumuladas.
+        inicio = self._turno(desde)
+        if inicio is None:
+            inicio = 0 if pd.Timestamp(desde) < self.inicio else self.num_turnos
+        fila = self.fila_por_id.get(restaurante_id)
+        encontrados = []
+        # Se examina por bloques de una semana para no recorrer los 90 días si no hace falta
+        for bloque in range(inicio, self.num_turnos, 7 * TURNOS_POR_DIA):
+            fin = min(bloque + 7 * TURNOS_POR_DIA + DURACION_RESERVA - 1, self.num_turnos)
+            if fila is None:
+                libre = np.full(fin - bloque, CAPACIDAD_POR_DEFECTO >= personas)
+            else:
+                libre = self.ocupacion[fila, bloque:fin].astype(np.int16) + personas <= self.capacidad[fila]
+            llenos = np.concatenate([[0], np.cumsum(~libre)])
+            ventanas = llenos[DURACION_RESERVA:] - llenos[:-DURACION_RESERVA] == 0
+            candidatos = np.flatnonzero(ventanas & self.apertura[bloque:bloque + len(ventanas)])
+            encontrados.extend(candidatos[:n - len(encontrados)] + bloque)
+            if len(encontrados) >= n:
+                break
+        return [self.inicio + timedelta(minutes=int(t) * MINUTOS_POR_TURNO) for t in encontrados]
+
+def cancelar_reserva(repositorio, motor, reserva, propietario):
+    # Las plazas solo se liberan si esta llamada es la que ha cancelado la reserva: una
+    # segunda cancelación (doble clic, otra pestaña) no las devuelve otra vez
+    if not repositorio.cancelar(reserva['id'], propietario):
+        return False
+    motor.liberar(reserva['restaurante_id'], reserva['fecha'], reserva['num_personas'])
+    return True
@@ -0,0 +1,708 @@
+# Índices en memoria del catálogo para la página de búsqueda: filtros de restaurantes
+# sobre bitsets, índice de texto de platos, tablas de consulta por id y el motor de
+# recomendaciones ("Restaurantes para ti").
+#
+# No depende de Streamlit; app.py los construye una vez por versión del catálogo y
+# benchmark.py los puede importar y medir sin ejecutar la página.
+import copy
+import heapq
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from catalogo import TIPOS_COCINA, tokenizar
+
+# -----------------------------
+# Índice de búsqueda de restaurantes
+# -----------------------------
+def distancia_km(lat, lon, lats, lons):
+    # Haversine vectorizada
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+TAMANO_CELDA_GRADOS = 0.01  # ~1,1 km de latitud
+
+# Flag del restaurante -> flag de plato que se agrega por restaurante
+FLAGS_PLATO = {'menu_celiaco': 'celiaco', 'menu_vegetariano': 'vegetariano', 'menu_vegano': 'vegano'}
+
+def resumen_platos(restaurantes, platos):
+    # Agregado de platos por fila de restaurantes: fracción de platos con cada marca de
+    # FLAGS_PLATO y precio típico (mediana de sus platos o centro del rango si no tiene)
+    n = len(restaurantes)
+    fila_por_id = pd.Series(np.arange(n), index=restaurantes['id'].to_numpy())
+    filas = fila_por_id.reindex(platos['restaurante_id'].to_numpy()).to_numpy()
+    con_restaurante = ~np.isnan(filas)
+    filas = filas[con_restaurante].astype(np.int64)
+    num_platos = np.maximum(np.bincount(filas, minlength=n), 1)
+    cobertura = {flag: np.bincount(filas, weights=platos[flag_plato].to_numpy(dtype=float)[con_restaurante], minlength=n) / num_platos
+                 for flag, flag_plato in FLAGS_PLATO.items()}
+    precio_tipico = (restaurantes['precio_min'].to_numpy(dtype=float) + restaurantes['precio_max'].to_numpy(dtype=float)) / 2
+    if len(filas):
+        medianas = pd.Series(platos['precio'].to_numpy(dtype=float)[con_restaurante]).groupby(filas).median()
+        precio_tipico[medianas.index.to_numpy()] = medianas.to_numpy()
+    return cobertura, precio_tipico
+
+class IndiceRestaurantes:
+    # Se construye una vez por versión del catálogo. Cada filtro se resuelve a un
+    # bitset empaquetado (uint8) sobre las filas de restaurantes y se combinan con AND.
+    # Las altas no lo reconstruyen: anexar() extiende una copia con las filas nuevas.
+    FLAGS = ['promocionado', 'menu_diario', 'menu_celiaco', 'menu_vegetariano', 'menu_vegano']
+
+    def __init__(self, restaurantes, platos):
+        self.n = len(restaurantes)
+        self.ids = restaurantes['id'].to_numpy(dtype=np.int64)
+        self.todos = self._empaquetar(np.ones(self.n, dtype=bool))
+        self.fila_por_id = pd.Series(np.arange(self.n), index=self.ids)
+
+        # Índices categóricos: tipo y flags de menú
+        tipos = restaurantes['tipo'].astype(str).to_numpy()
+        self.por_tipo = {t: self._empaquetar(tipos == t) for t in np.unique(tipos)}
+        flags = {f: restaurantes[f].fillna(False).to_numpy(dtype=bool, copy=True) for f in self.FLAGS}
+
+        # Un restaurante cumple una opción de menú si la declara o si tiene algún plato
+        # con esa marca; los tramos de precio usan el precio típico de sus platos
+        cobertura, precio_tipico = resumen_platos(restaurantes, platos)
+        for flag in FLAGS_PLATO:
+            flags[flag] |= cobertura[flag] > 0
+        self.por_flag = {f: self._empaquetar(m) for f, m in flags.items()}
+        tramo = np.searchsorted(LIMITES_TRAMOS_PRECIO, precio_tipico, side='right')
+        self.por_tramo_precio = np.array([self._empaquetar(tramo == i) for i in range(len(TRAMOS_PRECIO))])
+        self.por_tipo_matriz = np.array([self.por_tipo[t] for t in self.por_tipo]).reshape(len(self.por_tipo), -1)
+
+        # Índice de precios: valores distintos ordenados + bitset acumulado por umbral
+        self.precio_min_valores, self.precio_min_ge = self._indice_umbral(restaurantes['precio_min'], mayor_igual=True)
+        self.precio_max_valores, self.precio_max_le = self._indice_umbral(restaurantes['precio_max'], mayor_igual=False)
+
+        # Índice de texto de la ubicación con búsqueda por prefijo
+        self.ubicacion = self._indice_tokens(restaurantes['ubicacion'].to_numpy(), np.arange(self.n))
+
+        # Índice espacial: rejilla de celdas fijas con las filas ordenadas por celda
+        self.lat = pd.to_numeric(restaurantes['lat'], errors='coerce').to_numpy(dtype=float)
+        self.lon = pd.to_numeric(restaurantes['lon'], errors='coerce').to_numpy(dtype=float)
+        con_coordenadas = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lon))
+        celdas = self._celda(self.lat[con_coordenadas], self.lon[con_coordenadas])
+        orden = np.argsort(celdas, kind='stable')
+        self._agrupar_celdas(con_coordenadas[orden], celdas[orden])
+
+    def anexar(self, restaurantes):
+        # Nueva versión del índice para `restaurantes`, que son los de este índice más
+        # filas añadidas al final (altas, todavía sin platos). Lo que no cambia se
+        # comparte y cada bitset se extiende con las filas nuevas: O(n) copias en lugar
+        # de recalcular cada filtro.
+        n, m = self.n, len(restaurantes)
+        nuevas = restaurantes.iloc[n:]
+        indice = copy.copy(self)
+        indice.n = m
+        indice.ids = restaurantes['id'].to_numpy(dtype=np.int64)
+        indice.todos = self._empaquetar(np.ones(m, dtype=bool))
+        indice.fila_por_id = pd.Series(np.arange(m), index=indice.ids)
+
+        tipos = nuevas['tipo'].astype(str).to_numpy()
+        por_tipo = {t: self._extender(bits, tipos == t) for t, bits in self.por_tipo.items()}
+        for t in np.unique(tipos):
+            if t not in por_tipo:
+                por_tipo[t] = self._extender(np.zeros_like(self.todos), tipos == t)
+        indice.por_tipo = dict(sorted(por_tipo.items()))
+        indice.por_tipo_matriz = np.array(list(indice.por_tipo.values())).reshape(len(indice.por_tipo), -1)
+        # Sin platos, las opciones de menú son las declaradas y el precio típico es el centro del rango
+        indice.por_flag = {f: self._extender(self.por_flag[f], nuevas[f].fillna(False).to_numpy(dtype=bool))
+                           for f in self.FLAGS}
+        precio_tipico = (nuevas['precio_min'].to_numpy(dtype=float) + nuevas['precio_max'].to_numpy(dtype=float)) / 2
+        tramo = np.searchsorted(LIMITES_TRAMOS_PRECIO, precio_tipico, side='right')
+        indice.por_tramo_precio = self._extender(self.por_tramo_precio,
+                                                 np.arange(len(TRAMOS_PRECIO))[:, None] == tramo[None, :])
+        indice.precio_min_valores, indice.precio_min_ge = self._anexar_umbral(
+            self.precio_min_valores, self.precio_min_ge, nuevas['precio_min'], mayor_igual=True)
+        indice.precio_max_valores, indice.precio_max_le = self._anexar_umbral(
+            self.precio_max_valores, self.precio_max_le, nuevas['precio_max'], mayor_igual=False)
+
+        tokens, postings = self.ubicacion
+        por_token = dict(zip(tokens.tolist(), postings))
+        for token, filas in zip(*self._indice_tokens(nuevas['ubicacion'].to_numpy(), np.arange(n, m))):
+            por_token[token] = np.concatenate([por_token[token], filas]) if token in por_token else filas
+        ordenados = sorted(por_token)
+        indice.ubicacion = (np.array(ordenados, dtype=str), [por_token[t] for t in ordenados])
+
+        # Las filas nuevas se intercalan en la rejilla ya ordenada por celda
+        lat = pd.to_numeric(nuevas['lat'], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(nuevas['lon'], errors='coerce').to_numpy(dtype=float)
+        indice.lat = np.concatenate([self.lat, lat])
+        indice.lon = np.concatenate([self.lon, lon])
+        con_coordenadas = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        celdas_nuevas = self._celda(lat[con_coordenadas], lon[con_coordenadas])
+        orden = np.argsort(celdas_nuevas, kind='stable')
+        celdas = np.repeat(self.celdas, self.fin_celda - self.inicio_celda)
+        posiciones = np.searchsorted(celdas, celdas_nuevas[orden], side='right')
+        indice._agrupar_celdas(np.insert(self.filas_por_celda, posiciones, con_coordenadas[orden] + n),
+                               np.insert(celdas, posiciones, celdas_nuevas[orden]))
+        return indice
+
+    def _agrupar_celdas(self, filas, celdas):
+        # filas ordenadas por celda -> tramo [inicio, fin) de cada celda distinta
+        self.filas_por_celda = filas
+        self.celdas, self.inicio_celda = np.unique(celdas, return_index=True)
+        self.fin_celda = np.r_[self.inicio_celda[1:], len(filas)]
+
+    def _empaquetar(self, mascara):
+        return np.packbits(mascara)
+
+    def _extender(self, bits, mascara):
+        # Bitset (o matriz de bitsets) de las self.n filas + los bits de las filas nuevas
+        viejas = np.unpackbits(bits, axis=-1, count=self.n).astype(bool)
+        return np.packbits(np.concatenate([viejas, mascara], axis=-1), axis=-1)
+
+    def _celda(self, lat, lon):
+        fila = np.floor(np.asarray(lat) / TAMANO_CELDA_GRADOS).astype(np.int64)
+        columna = np.floor(np.asarray(lon) / TAMANO_CELDA_GRADOS).astype(np.int64)
+        return fila * 100000 + columna
+
+    def _filas_en_celdas(self, lat, lon, anillo):
+        # Filas de las celdas dentro de un cuadrado de (2*anillo+1)^2 celdas alrededor del punto
+        centro_fila = int(np.floor(lat / TAMANO_CELDA_GRADOS))
+        centro_columna = int(np.floor(lon / TAMANO_CELDA_GRADOS))
+        claves = np.array([(centro_fila + df) * 100000 + centro_columna + dc
+                           for df in range(-anillo, anillo + 1) for dc in range(-anillo, anillo + 1)])
+        posiciones = np.minimum(np.searchsorted(self.celdas, claves), len(self.celdas) - 1)
+        posiciones = posiciones[self.celdas[posiciones] == claves]
+        if len(posiciones) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.filas_por_celda[self.inicio_celda[p]:self.fin_celda[p]] for p in posiciones])
+
+    def _anillos(self, radio_km, lat):
+        # Celdas necesarias para cubrir el radio (la longitud se estrecha con la latitud)
+        km_por_celda = 111.0 * TAMANO_CELDA_GRADOS * max(np.cos(np.radians(lat)), 0.1)
+        return int(np.ceil(radio_km / km_por_celda))
+
+    def en_radio(self, lat, lon, radio_km):
+        if len(self.celdas) == 0:
+            return np.empty(0, dtype=np.int64)
+        candidatas = self._filas_en_celdas(lat, lon, self._anillos(radio_km, lat))
+        return candidatas[distancia_km(lat, lon, self.lat[candidatas], self.lon[candidatas]) <= radio_km]
+
+    def distancias(self, filas, lat, lon):
+        return distancia_km(lat, lon, self.lat[filas], self.lon[filas])
+
+    def mas_cercanos(self, lat, lon, k, **filtros):
+        # k vecinos más cercanos que cumplen los filtros: se amplía la rejilla por anillos
+        # hasta tener k candidatos y luego se añade un anillo más para no perder ninguno.
+        validos = np.unpackbits(self._bits(**filtros), count=self.n).astype(bool)
+        if not validos[self.filas_por_celda].any():
+            return np.empty(0, dtype=np.int64)
+        if len(self.celdas) == 0:
+            return np.empty(0, dtype=np.int64)
+        anillo = 1
+        while True:
+            candidatas = self._filas_en_celdas(lat, lon, anillo)
+            candidatas = candidatas[validos[candidatas]]
+            if len(candidatas) >= k or anillo > 1000:
+                break
+            anillo *= 2
+        radio = np.sort(self.distancias(candidatas, lat, lon))[min(k, len(candidatas)) - 1] if len(candidatas) else 0
+        candidatas = self._filas_en_celdas(lat, lon, max(anillo, self._anillos(radio, lat)))
+        candidatas = candidatas[validos[candidatas]]
+        return candidatas[np.argsort(self.distancias(candidatas, lat, lon), kind='stable')[:k]]
+
+    def _indice_umbral(self, columna, mayor_igual):
+        valores = pd.to_numeric(columna, errors='coerce').to_numpy(dtype=float)
+        distintos = np.unique(valores[~np.isnan(valores)])
+        bitsets = np.zeros((len(distintos), len(self.todos)), dtype=np.uint8)
+        for i, v in enumerate(distintos):
+            bitsets[i] = self._empaquetar(valores >= v if mayor_igual else valores <= v)
+        return distintos, bitsets
+
+    def _anexar_umbral(self, valores, bitsets, columna, mayor_igual):
+        # Un valor nuevo lo cumplen las filas antiguas que cumplen el valor existente más
+        # próximo en el sentido del umbral (el siguiente mayor para >=, el anterior para <=)
+        nuevos = pd.to_numeric(columna, errors='coerce').to_numpy(dtype=float)
+        distintos = np.union1d(valores, nuevos[~np.isnan(nuevos)])
+        if mayor_igual:
+            vecino = np.searchsorted(valores, distintos, side='left')
+            con_vecino = vecino < len(valores)
+        else:
+            vecino = np.searchsorted(valores, distintos, side='right') - 1
+            con_vecino = vecino >= 0
+        antiguos = np.zeros((len(distintos), len(self.todos)), dtype=np.uint8)
+        antiguos[con_vecino] = bitsets[vecino[con_vecino]]
+        cumplen = nuevos[None, :] >= distintos[:, None] if mayor_igual else nuevos[None, :] <= distintos[:, None]
+        return distintos, self._extender(antiguos, cumplen)
+
+    def _indice_tokens(self, textos, filas):
+        postings = {}
+        for texto, fila in zip(textos, filas):
+            for token in set(tokenizar(texto)):
+                postings.setdefault(token, set()).add(int(fila))
+        tokens = sorted(postings)
+        return np.array(tokens, dtype=str), [np.fromiter(postings[t], dtype=np.int64) for t in tokens]
+
+    def _buscar_texto(self, indice, consulta):
+        # Cada palabra de la consulta debe ser prefijo de algún token (AND entre palabras)
+        tokens, postings = indice
+        resultado = self.todos
+        for palabra in tokenizar(consulta):
+            ini = np.searchsorted(tokens, palabra, side='left')
+            fin = np.searchsorted(tokens, palabra + '\uffff', side='left')
+            mascara = np.zeros(self.n, dtype=bool)
+            for filas in postings[ini:fin]:
+                mascara[filas] = True
+            resultado = resultado & self._empaquetar(mascara)
+        return resultado
+
+    def _umbral(self, valores, bitsets, limite, mayor_igual):
+        if mayor_igual:
+            i = np.searchsorted(valores, limite, side='left')
+            return bitsets[i] if i < len(valores) else np.zeros_like(self.todos)
+        i = np.searchsorted(valores, limite, side='right') - 1
+        return bitsets[i] if i >= 0 else np.zeros_like(self.todos)
+
+    def _contar(self, bits):
+        # Popcount vectorizado: funciona igual con un bitset o con una matriz de bitsets
+        return BITS_POR_BYTE[bits].sum(axis=-1, dtype=np.int64)
+
+    def contar_facetas(self, tipo=None, solo_promocionados=False, precio=None, opciones_menu=(),
+                       ids_plato=None, ubicacion="", cerca=None):
+        # Recuentos en vivo para cada valor de faceta. Cada faceta se cuenta con la
+        # selección actual de las demás (para que el usuario vea a dónde puede moverse);
+        # las opciones de menú se combinan con AND, así que su recuento es el de añadirlas.
+        # La búsqueda de platos, la ubicación y el radio no son facetas: acotan todos los recuentos.
+        busqueda = self._bits(ids_plato=ids_plato, ubicacion=ubicacion) & self._bits_radio(cerca)
+        seleccion = dict(tipo=tipo, solo_promocionados=solo_promocionados, precio=precio, opciones_menu=opciones_menu)
+        sin_tipo = self._bits(**{**seleccion, 'tipo': None}) & busqueda
+        sin_promocion = self._bits(**{**seleccion, 'solo_promocionados': False}) & busqueda
+        sin_precio = self._bits(**{**seleccion, 'precio': None}) & busqueda
+        todas = self._bits(**seleccion) & busqueda
+        return {
+            'total': int(self._contar(todas)),
+            'tipo': dict(zip(self.por_tipo, self._contar(self.por_tipo_matriz & sin_tipo).tolist())),
+            'Todos': int(self._contar(sin_tipo)),
+            'menu': {opcion: int(self._contar(todas & self.por_flag[flag])) if flag else int(self._contar(todas))
+                     for opcion, flag in OPCIONES_MENU.items()},
+            'promocionado': int(self._contar(sin_promocion & self.por_flag['promocionado'])),
+            'tramo_precio': dict(zip(TRAMOS_PRECIO, self._contar(self.por_tramo_precio & sin_precio).tolist())),
+        }
+
+    def buscar(self, cerca=None, **filtros):
+        # cerca = (lat, lon, radio_km) limita a los restaurantes dentro del radio
+        bits = self._bits(**filtros) & self._bits_radio(cerca)
+        return np.flatnonzero(np.unpackbits(bits, count=self.n))
+
+    def _bits_radio(self, cerca):
+        if cerca is None:
+            return self.todos
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[self.en_radio(*cerca)] = True
+        return self._empaquetar(mascara)
+
+    def _bits(self, tipo=None, solo_promocionados=False, precio=None, opciones_menu=(),
+              ids_plato=None, ubicacion=""):
+        bits = self.todos
+        if tipo and tipo != "Todos":
+            bits = bits & self.por_tipo.get(tipo, np.zeros_like(self.todos))
+        if solo_promocionados:
+            bits = bits & self.por_flag['promocionado']
+        for opcion in opciones_menu:
+            flag = OPCIONES_MENU.get(opcion)
+            if flag:
+                bits = bits & self.por_flag[flag]
+        if precio is not None:
+            bits = bits & self._umbral(self.precio_min_valores, self.precio_min_ge, precio[0], True)
+            bits = bits & self._umbral(self.precio_max_valores, self.precio_max_le, precio[1], False)
+        if ids_plato is not None:
+            # Restaurantes con algún plato que coincide con la búsqueda de texto
+            filas = self.fila_por_id.reindex(np.asarray(ids_plato)).dropna().to_numpy(dtype=np.int64)
+            mascara = np.zeros(self.n, dtype=bool)
+            mascara[filas] = True
+            bits = bits & self._empaquetar(mascara)
+        if ubicacion and ubicacion.strip():
+            bits = bits & self._buscar_texto(self.ubicacion, ubicacion)
+        return bits
+
+OPCIONES_MENU = {
+    "Sin restricciones": None,
+    "Celíaco": 'menu_celiaco',
+    "Vegetariano": 'menu_vegetariano',
+    "Vegano": 'menu_vegano',
+}
+
+# Tramos del precio típico (mediana de los platos) para las facetas de precio
+LIMITES_TRAMOS_PRECIO = [10, 20, 30]
+TRAMOS_PRECIO = ["< 10 €", "10–20 €", "20–30 €", "≥ 30 €"]
+BITS_POR_BYTE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# -----------------------------
+# Índice de texto de platos
+# -----------------------------
+LONGITUD_PREFIJO_INDEXADO = 3  # prefijos con su propia lista de platos
+TAMANO_CACHE_INDICE_PLATOS = 1024  # listas de posiciones y resultados por consulta en caché
+
+class IndicePlatos:
+    # Índice invertido de tokens normalizados de platos['nombre'] con tabla de
+    # prefijos (trie aplanado) para búsqueda mientras se escribe. Se actualiza de
+    # forma incremental: solo se indexan las filas nuevas de platos_df.
+    # Los prefijos cortos ("p", "pa", "pae"), que son los que abarcan más tokens, tienen
+    # su propia lista de platos ya ordenada y sin repetidos, así que ninguna consulta
+    # une cientos de listas; la unión de los prefijos largos se calcula y se guarda en caché.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexados = 0
+        self.codigos = array('i')  # código denso del restaurante de cada plato
+        self.codigo_por_restaurante = {}
+        self.restaurantes = []
+        self.postings = {}
+        self.por_prefijo = {}
+        self.prefijos = {}
+        self.prefijos_cortos = {}  # token -> sus prefijos de hasta LONGITUD_PREFIJO_INDEXADO letras
+        self._arrays = OrderedDict()
+        self._resultados = OrderedDict()
+        self._codigos_array = np.empty(0, dtype=np.int32)
+        self._restaurantes_array = np.empty(0, dtype=np.int64)
+
+    def sincronizar(self, platos):
+        if len(platos) <= self.indexados:
+            return
+        with self.lock:
+            nuevos = platos.iloc[self.indexados:]
+            self.agregar(nuevos['nombre'].to_numpy(), nuevos['restaurante_id'].to_numpy())
+
+    def agregar(self, nombres, restaurante_ids):
+        for nombre, restaurante_id in zip(nombres, restaurante_ids):
+            posicion = len(self.codigos)
+            codigo = self.codigo_por_restaurante.get(int(restaurante_id))
+            if codigo is None:
+                codigo = self.codigo_por_restaurante[int(restaurante_id)] = len(self.restaurantes)
+                self.restaurantes.append(int(restaurante_id))
+            self.codigos.append(codigo)
+            prefijos_plato = set()
+            for token in set(tokenizar(nombre)):
+                if token not in self.postings:
+                    self.postings[token] = array('i')
+                    self.prefijos_cortos[token] = [token[:i] for i in range(1, min(len(token), LONGITUD_PREFIJO_INDEXADO) + 1)]
+                    for i in range(LONGITUD_PREFIJO_INDEXADO + 1, len(token) + 1):
+                        self.prefijos.setdefault(token[:i], set()).add(token)
+                self.postings[token].append(posicion)
+                prefijos_plato.update(self.prefijos_cortos[token])
+            for prefijo in prefijos_plato:
+                if prefijo not in self.por_prefijo:
+                    self.por_prefijo[prefijo] = array('i')
+                self.por_prefijo[prefijo].append(posicion)
+        self.indexados = len(self.codigos)
+        self._codigos_array = np.array(self.codigos, dtype=np.int32)
+        self._restaurantes_array = np.array(self.restaurantes, dtype=np.int64)
+        self._arrays.clear()
+        self._resultados.clear()
+
+    def _en_cache(self, cache, clave, calcular):
+        # LRU acotada; se vacía al indexar platos nuevos
+        with self.lock:
+            if clave in cache:
+                cache.move_to_end(clave)
+                return cache[clave]
+        valor = calcular()
+        with self.lock:
+            cache[clave] = valor
+            if len(cache) > TAMANO_CACHE_INDICE_PLATOS:
+                cache.popitem(last=False)
+        return valor
+
+    def _copiar(self, listas):
+        # Las listas crecen al indexar, así que se copian a NumPy bajo el lock
+        with self.lock:
+            return [np.array(lista, dtype=np.int32) for lista in listas]
+
+    def _posiciones(self, palabra):
+        # Platos con algún token que empieza por `palabra`, ordenados y sin repetidos
+        def calcular():
+            if len(palabra) <= LONGITUD_PREFIJO_INDEXADO:
+                partes = self._copiar([self.por_prefijo.get(palabra, ())])
+            else:
+                partes = self._copiar([self.postings[t] for t in self.prefijos.get(palabra, ())])
+            if len(partes) <= 1:
+                return partes[0] if partes else np.empty(0, dtype=np.int32)
+            return np.unique(np.concatenate(partes))
+        return self._en_cache(self._arrays, ('prefijo', palabra), calcular)
+
+    def _exactas(self, palabra):
+        return self._en_cache(self._arrays, ('token', palabra),
+                              lambda: self._copiar([self.postings.get(palabra, ())])[0])
+
+    def _interseccion(self, a, b):
+        # Índices (en a y en b) de las posiciones comunes de dos listas ordenadas, sin
+        # reordenar ninguna: búsqueda binaria de la más corta sobre la más larga o, si
+        # las dos son grandes, una tabla posición -> índice en b
+        if len(a) > len(b):
+            en_b, en_a = self._interseccion(b, a)
+            return en_a, en_b
+        if len(a) * 16 < self.indexados:
+            en_b = np.minimum(np.searchsorted(b, a), len(b) - 1)
+            comunes = b[en_b] == a
+            return np.flatnonzero(comunes), en_b[comunes]
+        lugar = np.full(self.indexados, -1, dtype=np.int32)
+        lugar[b] = np.arange(len(b), dtype=np.int32)
+        en_b = lugar[a]
+        comunes = en_b >= 0
+        return np.flatnonzero(comunes), en_b[comunes]
+
+    def buscar(self, consulta):
+        # Devuelve las posiciones de los platos que contienen todas las palabras
+        # (como token exacto o como prefijo) y su puntuación: 1 por palabra exacta, 0.5 por prefijo.
+        posiciones, puntos = None, None
+        for palabra in tokenizar(consulta):
+            pos = self._posiciones(palabra)
+            if len(pos) == 0:
+                return np.empty(0, dtype=np.int32), np.empty(0)
+            exactas = self._exactas(palabra)
+            if len(exactas) == len(pos):
+                peso = np.ones(len(pos))
+            else:
+                peso = np.full(len(pos), 0.5)
+                peso[np.searchsorted(pos, exactas)] = 1.0
+            if posiciones is None:
+                posiciones, puntos = pos, peso
+            else:
+                i, j = self._interseccion(posiciones, pos)
+                posiciones, puntos = posiciones[i], puntos[i] + peso[j]
+        if posiciones is None:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        return posiciones, puntos
+
+    def puntuar_restaurantes(self, consulta):
+        # Serie restaurante_id -> puntuación: la del mejor plato y, a igualdad, más cuantos
+        # más platos coinciden. Sin ordenar; el orden final lo decide la búsqueda.
+        palabras = tuple(tokenizar(consulta))
+        return self._en_cache(self._resultados, palabras, lambda: self._puntuar(palabras))
+
+    def _puntuar(self, palabras):
+        posiciones, puntos = self.buscar(" ".join(palabras))
+        if len(posiciones) == 0:
+            return pd.Series(dtype=float)
+        codigos = self._codigos_array[posiciones]
+        cuantos = np.bincount(codigos, minlength=len(self._restaurantes_array))
+        # Máximo por restaurante: las puntuaciones posibles son pocas (0,5 o 1 por palabra),
+        # así que se parte de la mínima y se asignan las demás de menor a mayor
+        minimo = 0.5 * len(palabras)
+        mejor = np.full(len(cuantos), minimo)
+        for valor in minimo + 0.5 * np.arange(1, len(palabras) + 1):
+            mejor[codigos[puntos == valor]] = valor
+        con_platos = np.flatnonzero(cuantos)
+        puntuacion = mejor[con_platos] + cuantos[con_platos] / (cuantos.max() + 1)
+        return pd.Series(puntuacion, index=self._restaurantes_array[con_platos])
+
+# -----------------------------
+# Tablas de consulta por id
+# -----------------------------
+# Marca del plato -> etiqueta que se muestra junto a su nombre
+ETIQUETAS_PLATO = [('celiaco', "Sin gluten"), ('vegetariano', "Vegetariano"), ('vegano', "Vegano")]
+
+class TablasCatalogo:
+    # Mapas id -> restaurante y restaurante_id -> platos, construidos una vez por
+    # versión del catálogo para no recorrer los DataFrames en cada fila pintada. Los
+    # platos se ordenan por restaurante una sola vez y los de cada restaurante son un
+    # tramo contiguo de esa tabla que se localiza con searchsorted.
+    def __init__(self, restaurantes, platos):
+        self.restaurantes = restaurantes
+        self.fila_restaurante = pd.Index(restaurantes['id'].to_numpy())
+        orden = np.argsort(platos['restaurante_id'].to_numpy(), kind='stable')
+        platos = platos.take(orden).reset_index(drop=True)
+        # Texto de etiquetas de las 8 combinaciones de marcas, elegido con un código de 3 bits
+        codigo = np.zeros(len(platos), dtype=np.int64)
+        for bit, (columna, _) in enumerate(ETIQUETAS_PLATO):
+            codigo |= platos[columna].to_numpy(dtype=bool).astype(np.int64) << bit
+        textos = []
+        for combinacion in range(2 ** len(ETIQUETAS_PLATO)):
+            partes = [texto for bit, (_, texto) in enumerate(ETIQUETAS_PLATO) if combinacion >> bit & 1]
+            textos.append(f" ({', '.join(partes)})" if partes else "")
+        platos['etiquetas'] = np.array(textos, dtype=object)[codigo]
+        self.platos_ordenados = platos
+        self.restaurante_de_plato = platos['restaurante_id'].to_numpy()
+        self.fila_plato = pd.Index(platos['id'].to_numpy())
+
+    def anexar(self, restaurantes):
+        # Restaurantes añadidos al final y todavía sin platos: solo crece el mapa de ids
+        tablas = copy.copy(self)
+        tablas.restaurantes = restaurantes
+        tablas.fila_restaurante = self.fila_restaurante.append(
+            pd.Index(restaurantes['id'].to_numpy()[len(self.restaurantes):]))
+        return tablas
+
+    def restaurante(self, restaurante_id):
+        # Un id que ya no está en el catálogo (p. ej. reservas de un alta perdida) se
+        # pinta como "no disponible" en lugar de romper la página
+        try:
+            return self.restaurantes.iloc[self.fila_restaurante.get_loc(restaurante_id)]
+        except KeyError:
+            return self._desconocido(self.restaurantes.columns, restaurante_id, "Restaurante no disponible")
+
+    def platos(self, restaurante_id):
+        inicio = np.searchsorted(self.restaurante_de_plato, restaurante_id, side='left')
+        fin = np.searchsorted(self.restaurante_de_plato, restaurante_id, side='right')
+        return self.platos_ordenados.iloc[inicio:fin]
+
+    def plato(self, plato_id):
+        try:
+            return self.platos_ordenados.iloc[self.fila_plato.get_loc(plato_id)]
+        except KeyError:
+            return self._desconocido(self.platos_ordenados.columns, plato_id, "Plato no disponible")
+
+    def _desconocido(self, columnas, id_buscado, nombre):
+        valores = {'id': id_buscado, 'nombre': nombre, 'ubicacion': "", 'etiquetas': ""}
+        return pd.Series({columna: valores.get(columna) for columna in columnas}, dtype=object)
+
+# -----------------------------
+# Motor de recomendaciones
+# -----------------------------
+NUM_RECOMENDACIONES = 3
+TAMANO_LOTE_RECOMENDACION = 16384
+PESO_VALORACION = 0.5
+PESO_PROMOCION = 0.15
+
+def peso_valoracion(puntuacion):
+    # 5 estrellas suman el restaurante al perfil, 3 no aportan y 1 lo resta
+    return (float(puntuacion) - 3) / 2
+
+class MotorRecomendaciones:
+    # Vector denso por restaurante (tipo one-hot, cobertura dietética de sus platos, tramo
+    # de precio, valoración y promoción) y por usuario (media de los vectores de los
+    # restaurantes que ha reservado o valorado, más pesos fijos para valoración y
+    # promoción). Se puntúa con productos matriz-vector por lotes y un heap de los K
+    # mejores, con caché por usuario. Los restaurantes nuevos se añaden al final y cada
+    # reserva o valoración actualiza el perfil sin volver a leer el historial.
+    COLUMNAS_PREFERENCIA = len(TIPOS_COCINA) + len(FLAGS_PLATO) + len(TRAMOS_PRECIO)
+    COLUMNA_VALORACION = COLUMNAS_PREFERENCIA
+    COLUMNA_PROMOCION = COLUMNAS_PREFERENCIA + 1
+
+    def __init__(self, historial, valoraciones):
+        # historial(): lista de (usuario, restaurante_id, peso, cuenta) con la que se
+        # construyen los perfiles la primera vez; valoraciones: agregados en vivo
+        self.lock = threading.Lock()
+        self.historial = historial
+        self.valoraciones = valoraciones
+        self.ids = np.empty(0, dtype=np.int64)
+        self.caracteristicas = np.empty((0, self.COLUMNAS_PREFERENCIA + 2), dtype=np.float32)
+        self.fila_por_id = {}
+        self.version = 0  # sube con el catálogo o las valoraciones e invalida las cachés
+        self.perfiles = None
+        self.cache = {}
+
+    def _normalizar(self, valoracion):
+        return np.clip((np.asarray(valoracion, dtype=np.float32) - 3) / 2, -1, 1)
+
+    def _vectores(self, restaurantes, platos):
+        n = len(restaurantes)
+        vectores = np.zeros((n, self.COLUMNAS_PREFERENCIA + 2), dtype=np.float32)
+        tipos = pd.Categorical(restaurantes['tipo'], categories=TIPOS_COCINA).codes
+        conocidos = np.flatnonzero(tipos >= 0)
+        vectores[conocidos, tipos[conocidos]] = 1
+        cobertura, precio_tipico = resumen_platos(restaurantes, platos)
+        columna = len(TIPOS_COCINA)
+        for flag in FLAGS_PLATO:
+            vectores[:, columna] = np.maximum(cobertura[flag], restaurantes[flag].fillna(False).to_numpy(dtype=float))
+            columna += 1
+        vectores[np.arange(n), columna + np.searchsorted(LIMITES_TRAMOS_PRECIO, precio_tipico, side='right')] = 1
+        valoracion = [self.valoraciones.puntuacion('restaurante', i, v)
+                      for i, v in zip(restaurantes['id'].tolist(), restaurantes['valoracion'].tolist())]
+        vectores[:, self.COLUMNA_VALORACION] = self._normalizar(valoracion)
+        vectores[:, self.COLUMNA_PROMOCION] = restaurantes['promocionado'].fillna(False).to_numpy(dtype=float)
+        return vectores
+
+    def sincronizar(self, restaurantes, platos):
+        # Solo calcula los vectores de los restaurantes añadidos desde la última vez
+        if len(restaurantes) <= len(self.ids):
+            return
+        with self.lock:
+            nuevos = restaurantes.iloc[len(self.ids):]
+            if nuevos.empty:
+                return
+            self.caracteristicas = np.vstack([self.caracteristicas, self._vectores(nuevos, platos)])
+            self.fila_por_id.update(zip(nuevos['id'].tolist(), range(len(self.ids), len(self.ids) + len(nuevos))))
+            self.ids = np.concatenate([self.ids, nuevos['id'].to_numpy(dtype=np.int64)])
+            self.version += 1
+
+    def _perfiles(self):
+        self._cargar_perfiles()
+        return self.perfiles
+
+    def _cargar_perfiles(self):
+        # Devuelve True si acaba de leer el historial. Las reservas y valoraciones se
+        # guardan en la base de datos antes de registrarlas aquí, así que ese historial
+        # ya incluye el evento que se está registrando y no hay que sumarlo otra vez.
+        if self.perfiles is not None:
+            return False
+        self.perfiles = {}
+        for usuario, restaurante_id, peso, cuenta in self.historial():
+            self._acumular(usuario, restaurante_id, peso, cuenta)
+        return True
+
+    def _acumular(self, usuario, restaurante_id, peso, cuenta):
+        fila = self.fila_por_id.get(int(restaurante_id))
+        if fila is None:
+            return
+        perfil = self.perfiles.setdefault(usuario, {'suma': np.zeros(self.COLUMNAS_PREFERENCIA), 'num': 0, 'version': 0})
+        perfil['suma'] += peso * self.caracteristicas[fila, :self.COLUMNAS_PREFERENCIA]
+        perfil['num'] += cuenta
+        perfil['version'] += 1
+
+    def registrar_reserva(self, usuario, restaurante_id, cancelada=False):
+        with self.lock:
+            if self._cargar_perfiles():
+                return
+            signo = -1 if cancelada else 1
+            self._acumular(usuario, restaurante_id, float(signo), signo)
+
+    def registrar_valoraciones(self, usuario, valoraciones):
+        with self.lock:
+            if not self._cargar_perfiles():
+                for v in valoraciones:
+                    self._acumular(usuario, v['restaurante_id'], peso_valoracion(v['puntuacion']), 1)
+            # La valoración agregada de los restaurantes valorados cambia para todos
+            caracteristicas = self.caracteristicas.copy()
+            for restaurante_id in {int(v['restaurante_id']) for v in valoraciones if v['tipo'] == 'restaurante'}:
+                fila = self.fila_por_id.get(restaurante_id)
+                if fila is not None:
+                    actual = 3 + 2 * float(caracteristicas[fila, self.COLUMNA_VALORACION])
+                    caracteristicas[fila, self.COLUMNA_VALORACION] = self._normalizar(
+                        self.valoraciones.puntuacion('restaurante', restaurante_id, actual))
+            self.caracteristicas = caracteristicas
+            self.version += 1
+
+    def _vector_usuario(self, usuario):
+        perfil = self._perfiles().get(usuario)
+        vector = np.zeros(self.caracteristicas.shape[1], dtype=np.float32)
+        if perfil and perfil['num'] > 0:
+            vector[:self.COLUMNAS_PREFERENCIA] = perfil['suma'] / perfil['num']
+        vector[self.COLUMNA_VALORACION] = PESO_VALORACION
+        vector[self.COLUMNA_PROMOCION] = PESO_PROMOCION
+        return vector, (self.version, perfil['version'] if perfil else 0)
+
+    def puntuar(self, usuario, filas):
+        # Afinidad del usuario con las filas indicadas (mismo orden que el catálogo)
+        with self.lock:
+            vector, _ = self._vector_usuario(usuario)
+            caracteristicas = self.caracteristicas
+        return caracteristicas[filas] @ vector
+
+    def recomendar(self, usuario, k=NUM_RECOMENDACIONES):
+        with self.lock:
+            vector, clave = self._vector_usuario(usuario)
+            cacheado = self.cache.get(usuario)
+            if cacheado is not None and cacheado[0] == (clave, k):
+                return cacheado[1]
+            caracteristicas, ids = self.caracteristicas, self.ids
+        mejores = []  # heap mínimo de (puntos, -fila): a igualdad gana la fila anterior
+        for inicio in range(0, len(caracteristicas), TAMANO_LOTE_RECOMENDACION):
+            puntos = caracteristicas[inicio:inicio + TAMANO_LOTE_RECOMENDACION] @ vector
+            candidatos = np.argpartition(-puntos, k - 1)[:k] if len(puntos) > k else np.arange(len(puntos))
+            for j in candidatos.tolist():
+                elemento = (float(puntos[j]), -(inicio + j))
+                if len(mejores) < k:
+                    heapq.heappush(mejores, elemento)
+                elif elemento > mejores[0]:
+                    heapq.heapreplace(mejores, elemento)
+        mejores.sort(reverse=True)
+        resultado = (ids[np.array([-fila for _, fila in mejores], dtype=np.int64)],
+                     np.array([puntos for puntos, _ in mejores], dtype=np.float32))
+        with self.lock:
+            self.cache[usuario] = ((clave, k), resultado)
+        return resultado
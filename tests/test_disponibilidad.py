@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from disponibilidad import CAPACIDAD_POR_DEFECTO, DIAS_CALENDARIO, MotorDisponibilidad, cancelar_reserva
+
+HOY = date(2026, 1, 5)
+MANANA = HOY + timedelta(days=1)
+
+def a_las(hora, dia=MANANA):
+    return datetime.combine(dia, datetime.strptime(hora, "%H:%M").time())
+
+class RepositorioEnMemoria:
+    # Misma semántica que RepositorioReservas.cancelar: filas cambiadas (0 si ya estaba cancelada)
+    def __init__(self, ids):
+        self.activas = set(ids)
+
+    def cancelar(self, reserva_id, propietario):
+        if reserva_id not in self.activas:
+            return 0
+        self.activas.remove(reserva_id)
+        return 1
+
+@pytest.fixture
+def motor():
+    return MotorDisponibilidad(HOY)
+
+def test_rechaza_reservas_por_encima_de_la_capacidad(motor):
+    assert motor.reservar(1, a_las("20:00"), CAPACIDAD_POR_DEFECTO)
+    assert not motor.reservar(1, a_las("20:00"), 1)
+    # Una reserva ocupa dos horas: también se solapa con las llegadas posteriores
+    assert not motor.reservar(1, a_las("21:45"), 1)
+    assert motor.reservar(1, a_las("22:00"), 1)
+    assert motor.reservar(2, a_las("20:00"), 1)
+
+def test_mover_fallido_restaura_las_plazas_anteriores(motor):
+    assert motor.reservar(1, a_las("20:00"), 30)
+    assert motor.reservar(1, a_las("21:00"), 10)
+    antes = motor.ocupacion.copy()
+    assert not motor.mover(1, a_las("20:00"), 30, a_las("21:00"), 35)
+    assert (motor.ocupacion == antes).all()
+    assert not motor.reservar(1, a_las("20:00"), 1)
+
+def test_doble_cancelacion_libera_las_plazas_una_vez(motor):
+    reservas = [{'id': i, 'restaurante_id': 1, 'fecha': a_las("20:00"), 'num_personas': 20} for i in (1, 2)]
+    for reserva in reservas:
+        assert motor.reservar(1, reserva['fecha'], reserva['num_personas'])
+    repositorio = RepositorioEnMemoria([1, 2])
+    assert cancelar_reserva(repositorio, motor, reservas[0], "visitante")
+    assert not cancelar_reserva(repositorio, motor, reservas[0], "visitante")
+    # Siguen ocupadas las 20 plazas de la segunda reserva
+    assert not motor.reservar(1, a_las("20:00"), 21)
+    assert motor.reservar(1, a_las("20:00"), 20)
+
+@pytest.mark.parametrize("hora", ["12:45", "16:15", "17:00", "19:45", "23:15"])
+def test_rechaza_horas_fuera_del_servicio(motor, hora):
+    assert not motor.reservar(1, a_las(hora), 2)
+    assert motor.motivo_rechazo(a_las(hora)).startswith("Solo se admiten reservas con hora de llegada")
+    assert motor.reservar(1, a_las("20:00"), 2)
+    assert not motor.mover(1, a_las("20:00"), 2, a_las(hora), 2)
+
+@pytest.mark.parametrize("hora", ["13:00", "16:00", "20:00", "23:00"])
+def test_admite_los_limites_del_servicio(motor, hora):
+    assert motor.motivo_rechazo(a_las(hora)) is None
+    assert motor.reservar(1, a_las(hora), 2)
+
+def test_rechaza_fechas_fuera_del_calendario(motor):
+    fuera = a_las("20:00", HOY + timedelta(days=DIAS_CALENDARIO))
+    assert not motor.reservar(1, fuera, 2)
+    assert motor.motivo_rechazo(fuera).startswith("Solo se admiten reservas entre")
+    assert not motor.reservar(1, a_las("20:00", HOY - timedelta(days=1)), 2)
+
+def test_forzar_ignora_el_horario(motor):
+    # Reconstrucción desde la base de datos de reservas anteriores al horario de servicio
+    assert motor.reservar(1, a_las("17:00"), 2, forzar=True)